@@ -0,0 +1,76 @@
+"""Add composite indexes for admin conversation/task listings.
+
+Adds:
+- conversation (hotel_id, updated_at DESC)   -> list_conversations ordering
+- message (conversation_id, created_at DESC)  -> last message / history lookups
+- task (hotel_id, created_at DESC)            -> list_tasks ordering
+- task (stay_id) WHERE status = 'OPEN'        -> open task counts per stay
+- guest (hotel_id) WHERE phone_hash NOT LIKE 'GDPR_DELETED_%' -> GDPR filter
+
+Indexes are built CONCURRENTLY so large tables are not locked during deploy.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0016_listing_indexes"
+down_revision = "0015_subscription"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversation_hotel_updated",
+            "conversation",
+            ["hotel_id", sa.text("updated_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_message_conversation_created",
+            "message",
+            ["conversation_id", sa.text("created_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_task_hotel_created",
+            "task",
+            ["hotel_id", sa.text("created_at DESC")],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_task_stay_open",
+            "task",
+            ["stay_id"],
+            postgresql_where=sa.text("status = 'OPEN'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+        op.create_index(
+            "ix_guest_hotel_active",
+            "guest",
+            ["hotel_id"],
+            postgresql_where=sa.text("phone_hash NOT LIKE 'GDPR_DELETED_%'"),
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_guest_hotel_active", table_name="guest", postgresql_concurrently=True)
+        op.drop_index("ix_task_stay_open", table_name="task", postgresql_concurrently=True)
+        op.drop_index("ix_task_hotel_created", table_name="task", postgresql_concurrently=True)
+        op.drop_index(
+            "ix_message_conversation_created", table_name="message", postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_conversation_hotel_updated", table_name="conversation", postgresql_concurrently=True
+        )
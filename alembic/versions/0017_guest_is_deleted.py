@@ -0,0 +1,43 @@
+"""Add guest.is_deleted flag for GDPR-erased guests.
+
+Replaces the non-sargable ``phone_hash NOT LIKE 'GDPR_DELETED_%'`` filter with
+a boolean column. Existing anonymized guests are backfilled and the partial
+index from 0016 is rebuilt on the new column.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0017_guest_is_deleted"
+down_revision = "0016_listing_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "guest",
+        sa.Column("is_deleted", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+    op.execute("UPDATE guest SET is_deleted = true WHERE phone_hash LIKE 'GDPR_DELETED_%'")
+
+    op.drop_index("ix_guest_hotel_active", table_name="guest", if_exists=True)
+    op.create_index(
+        "ix_guest_hotel_active",
+        "guest",
+        ["hotel_id"],
+        postgresql_where=sa.text("is_deleted = false"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_guest_hotel_active", table_name="guest")
+    op.create_index(
+        "ix_guest_hotel_active",
+        "guest",
+        ["hotel_id"],
+        postgresql_where=sa.text("phone_hash NOT LIKE 'GDPR_DELETED_%'"),
+    )
+    op.drop_column("guest", "is_deleted")
@@ -0,0 +1,63 @@
+"""Denormalize last message and open task count onto conversation.
+
+Adds:
+- conversation.last_message_text
+- conversation.last_message_at
+- conversation.open_tasks_count
+
+Existing rows are backfilled; afterwards the ORM listeners in app.models keep
+them in sync as messages and tasks are written.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "0018_conversation_summary"
+down_revision = "0017_guest_is_deleted"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("conversation", sa.Column("last_message_text", sa.Text(), nullable=True))
+    op.add_column(
+        "conversation", sa.Column("last_message_at", sa.DateTime(timezone=True), nullable=True)
+    )
+    op.add_column(
+        "conversation",
+        sa.Column("open_tasks_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.execute(
+        """
+        UPDATE conversation c
+        SET last_message_text = m.text, last_message_at = m.created_at
+        FROM (
+            SELECT DISTINCT ON (conversation_id) conversation_id, text, created_at
+            FROM message
+            ORDER BY conversation_id, created_at DESC, id DESC
+        ) m
+        WHERE m.conversation_id = c.id
+        """
+    )
+    op.execute(
+        """
+        UPDATE conversation c
+        SET open_tasks_count = t.cnt
+        FROM (
+            SELECT stay_id, count(*) AS cnt
+            FROM task
+            WHERE status = 'OPEN' AND stay_id IS NOT NULL
+            GROUP BY stay_id
+        ) t
+        WHERE c.stay_id = t.stay_id
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("conversation", "open_tasks_count")
+    op.drop_column("conversation", "last_message_at")
+    op.drop_column("conversation", "last_message_text")
@@ -0,0 +1,78 @@
+"""Move uploaded knowledge/menu text out of hotel.settings into hotel_document.
+
+Creates hotel_document (hotel_id, kind, content, sha256) and moves
+settings.custom_knowledge_text / settings.hotel_products_text into it.
+hotel.settings keeps only <kind>_length and <kind>_sha256.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.sql import func
+
+
+# revision identifiers, used by Alembic.
+revision = "0019_hotel_document"
+down_revision = "0018_conversation_summary"
+branch_labels = None
+depends_on = None
+
+# settings key -> hotel_document.kind
+DOCUMENT_FIELDS = {
+    "custom_knowledge_text": "custom_knowledge",
+    "hotel_products_text": "hotel_products",
+}
+
+
+def upgrade() -> None:
+    op.create_table(
+        "hotel_document",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("hotel_id", sa.Integer(), sa.ForeignKey("hotel.id"), nullable=False),
+        sa.Column("kind", sa.String(length=50), nullable=False),
+        sa.Column("content", sa.Text(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column(
+            "created_at", sa.DateTime(timezone=True), server_default=func.now(), nullable=False
+        ),
+        sa.Column(
+            "updated_at", sa.DateTime(timezone=True), server_default=func.now(), nullable=False
+        ),
+        sa.UniqueConstraint("hotel_id", "kind", name="uq_hotel_document_kind"),
+    )
+    op.create_index("ix_hotel_document_hotel_id", "hotel_document", ["hotel_id"])
+
+    for field, kind in DOCUMENT_FIELDS.items():
+        op.execute(
+            f"""
+            INSERT INTO hotel_document (hotel_id, kind, content, sha256)
+            SELECT id, '{kind}', btrim(settings::jsonb ->> '{field}'),
+                   encode(sha256(convert_to(btrim(settings::jsonb ->> '{field}'), 'UTF8')), 'hex')
+            FROM hotel
+            WHERE settings IS NOT NULL AND settings::jsonb ? '{field}'
+            """
+        )
+        op.execute(
+            f"""
+            UPDATE hotel h
+            SET settings = ((h.settings::jsonb - '{field}') || jsonb_build_object(
+                '{kind}_length', char_length(d.content), '{kind}_sha256', d.sha256
+            ))::json
+            FROM hotel_document d
+            WHERE d.hotel_id = h.id AND d.kind = '{kind}'
+            """
+        )
+
+
+def downgrade() -> None:
+    for field, kind in DOCUMENT_FIELDS.items():
+        op.execute(
+            f"""
+            UPDATE hotel h
+            SET settings = ((h.settings::jsonb - '{kind}_length' - '{kind}_sha256')
+                || jsonb_build_object('{field}', d.content))::json
+            FROM hotel_document d
+            WHERE d.hotel_id = h.id AND d.kind = '{kind}'
+            """
+        )
+    op.drop_index("ix_hotel_document_hotel_id", table_name="hotel_document")
+    op.drop_table("hotel_document")
@@ -0,0 +1,38 @@
+"""Add a composite index for the admin notification handoff count.
+
+Adds:
+- conversation (hotel_id, current_handler, updated_at) -> notifications/check handoff count
+
+The task side of notifications/check is already served by ix_task_hotel_created.
+Built CONCURRENTLY so the conversation table is not locked during deploy.
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0020_conversation_handler_index"
+down_revision = "0019_hotel_document"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_conversation_hotel_handler_updated",
+            "conversation",
+            ["hotel_id", "current_handler", "updated_at"],
+            postgresql_concurrently=True,
+            if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            "ix_conversation_hotel_handler_updated",
+            table_name="conversation",
+            postgresql_concurrently=True,
+        )
@@ -23,6 +23,7 @@ from app.models import (
     TaskStatus,
     TaskType,
 )
+from app.services.hotel_documents import get_document, has_document
 from app.services.llm_client import LLMClient, _sanitize_text
 from app.services.staff_notifier import notify_new_task
 
@@ -105,7 +106,7 @@ def _build_tools(staff_lang: str, hotel_settings: dict = None) -> list:
     ]
 
     # Only add add_to_task tool if FOOD_BEVERAGE is enabled AND menu exists
-    menu_exists = bool(settings.get("hotel_products_text", "").strip())
+    menu_exists = has_document(settings, "hotel_products_text")
     if settings.get("allow_food_beverage", False) and menu_exists:
         tools.append(
             {
@@ -259,7 +260,7 @@ class HotelBrain:
         parking_info = settings.get("parking_info", "")
         # Only show menu if Food & Beverage is enabled
         if settings.get("allow_food_beverage", False):
-            menu_text = settings.get("hotel_products_text", "").strip()
+            menu_text = get_document(self.hotel, "hotel_products_text")
             if menu_text:
                 menu = menu_text
             else:
@@ -267,7 +268,7 @@ class HotelBrain:
         else:
             menu = "Food & Beverage service is DISABLED. Do NOT show any menu items. If guest asks, politely refuse and suggest contacting reception."
         # CRITICAL: UI field is "custom_knowledge_text" not "hotel_policies_text"
-        knowledge = settings.get("custom_knowledge_text", "")
+        knowledge = get_document(self.hotel, "custom_knowledge_text")
         _welcome = settings.get("welcome_text", "")  # Reserved for future use
 
         # Build disabled services section
@@ -994,7 +995,7 @@ The task summaries for staff are always in {staff_lang.upper()}, but your respon
         # === BUTTON DETECTION: Hotel Policies ===
         msg_lower = user_message.lower().strip()
         if msg_lower in ["hotel policies", "politici hotel", "นโยบายโรงแรม"]:
-            knowledge = (self.hotel.settings or {}).get("custom_knowledge_text", "")
+            knowledge = get_document(self.hotel, "custom_knowledge_text")
             if knowledge and "standard hotel policies" not in knowledge.lower():
                 return knowledge, None
             else:
@@ -1008,8 +1009,7 @@ The task summaries for staff are always in {staff_lang.upper()}, but your respon
                 return fallback, None
         # === BUTTON DETECTION: Menu ===
         if msg_lower in ["menu", "meniu", "เมนู"]:
-            settings = self.hotel.settings or {}
-            menu_text = settings.get("hotel_products_text", "").strip()
+            menu_text = get_document(self.hotel, "hotel_products_text")
             if menu_text:
                 return menu_text, None
             # No menu in DB - let LLM handle (will say "contact reception")
@@ -1,14 +1,22 @@
 import html
 from datetime import datetime, timezone
+from types import MappingProxyType
 from typing import Optional
 
-from fastapi import APIRouter, Body, Depends, HTTPException, Request
-from fastapi.responses import HTMLResponse
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    Body,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+)
+from sqlalchemy import lambda_stmt, select
+from sqlalchemy.orm import Session, joinedload, selectinload
 
 from app.core.config import get_settings
-from app.core.db import get_db
+from app.core.db import SessionLocal, get_db
 from app.core.logging import logger
 from app.core.security import decode_access_token, get_bearer_token
 from app.models import GuestPII  # noqa: F401
@@ -32,6 +40,23 @@ from app.services.messaging.factory import get_message_provider
 settings = get_settings()
 router = APIRouter(prefix="/admin", tags=["admin"])
 
+# System messages sent to the guest when staff take over / hand back the chat.
+# "th" is bilingual TH/EN so staff can read it too.
+_TAKEOVER_MSGS = MappingProxyType(
+    {
+        "en": "A staff member has joined the conversation. You're now chatting directly with the hotel.",
+        "ro": "Un membru al echipei a intrat în conversație. Comunici direct cu hotelul acum.",
+        "th": "พนักงานได้เข้าร่วมการสนทนาแล้ว / A staff member has joined the conversation.",
+    }
+)
+_RESUME_MSGS = MappingProxyType(
+    {
+        "en": "The conversation has returned to the virtual assistant.",
+        "ro": "Conversația a revenit la asistentul virtual.",
+        "th": "การสนทนาได้กลับไปยังผู้ช่วยเสมือนแล้ว / The conversation has returned to the virtual assistant.",
+    }
+)
+
 
 def require_staff(request: Request, db: Session = Depends(get_db)) -> StaffUser:
     token = get_bearer_token(request)
@@ -51,11 +76,16 @@ def require_staff(request: Request, db: Session = Depends(get_db)) -> StaffUser:
             return None  # type: ignore[return-value]
         raise HTTPException(status_code=401, detail="Unauthorized")
     payload = decode_access_token(token)
-    user = (
-        db.query(StaffUser)
-        .filter(StaffUser.id == int(payload.get("sub")), StaffUser.is_active == True)  # noqa: E712
-        .first()
-    )
+    # Load the hotel with the user so handlers can use staff.hotel without another SELECT.
+    # lambda_stmt caches the built statement; each request only binds user_id
+    user_id = int(payload.get("sub"))
+    user = db.execute(
+        lambda_stmt(
+            lambda: select(StaffUser)
+            .options(joinedload(StaffUser.hotel))
+            .where(StaffUser.id == user_id, StaffUser.is_active == True)  # noqa: E712
+        )
+    ).scalar_one_or_none()
     if not user:
         raise HTTPException(status_code=401, detail="Unauthorized")
     request.state.user = user
@@ -71,7 +101,7 @@ def require_staff(request: Request, db: Session = Depends(get_db)) -> StaffUser:
 @router.get("/ui-config")
 def admin_ui_config(db: Session = Depends(get_db), _user=Depends(require_staff)):
     """Expose UI configuration (language + lock) for the current staff's hotel."""
-    hotel = db.query(Hotel).filter(Hotel.id == _user.hotel_id).first() if _user else None
+    hotel = _user.hotel if _user else None  # eager-loaded by require_staff
     return {
         "interface_language": hotel.interface_language if hotel else "en",
         "language_locked": hotel.language_locked if hotel else False,
@@ -84,7 +114,7 @@ def get_subscription_status(db: Session = Depends(get_db), _user=Depends(require
     if not _user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    hotel = db.query(Hotel).filter(Hotel.id == _user.hotel_id).first()
+    hotel: Hotel = _user.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -94,12 +124,9 @@ def get_subscription_status(db: Session = Depends(get_db), _user=Depends(require
     is_expired = False
 
     if tier == "free" and trial_ends_at:
-        now = datetime.now(timezone.utc)
         if trial_ends_at.tzinfo is None:
-            from datetime import timezone as tz
-
-            trial_ends_at = trial_ends_at.replace(tzinfo=tz.utc)
-        delta = trial_ends_at - now
+            trial_ends_at = trial_ends_at.replace(tzinfo=timezone.utc)
+        delta = trial_ends_at - datetime.now(timezone.utc)
         days_remaining = max(0, delta.days)
         is_expired = delta.total_seconds() < 0
 
@@ -131,7 +158,7 @@ def list_conversations(
         .join(Guest)
         .filter(
             Conversation.hotel_id == _user.hotel_id,
-            ~Guest.phone_hash.like("GDPR_DELETED_%"),
+            Guest.is_deleted.is_(False),
         )
         .count()
     )
@@ -144,7 +171,7 @@ def list_conversations(
         .join(Guest)
         .filter(
             Conversation.hotel_id == _user.hotel_id,
-            ~Guest.phone_hash.like("GDPR_DELETED_%"),
+            Guest.is_deleted.is_(False),
         )
         .options(
             joinedload(Conversation.guest).joinedload(Guest.pii),
@@ -157,46 +184,6 @@ def list_conversations(
         .all()
     )
 
-    # Get conversation IDs for batch queries
-    conv_ids = [c.id for c in conversations]
-    stay_ids = [c.stay_id for c in conversations if c.stay_id]
-
-    # Batch query: last message per conversation (subquery)
-    last_messages = {}
-    if conv_ids:
-        # Subquery to get max created_at per conversation
-        subq = (
-            db.query(
-                Message.conversation_id,
-                func.max(Message.created_at).label("max_created"),
-            )
-            .filter(Message.conversation_id.in_(conv_ids))
-            .group_by(Message.conversation_id)
-            .subquery()
-        )
-        # Join to get actual message text
-        msgs = (
-            db.query(Message.conversation_id, Message.text)
-            .join(
-                subq,
-                (Message.conversation_id == subq.c.conversation_id)
-                & (Message.created_at == subq.c.max_created),
-            )
-            .all()
-        )
-        last_messages = {m.conversation_id: m.text for m in msgs}
-
-    # Batch query: open tasks count per stay
-    open_tasks = {}
-    if stay_ids:
-        tasks_count = (
-            db.query(Task.stay_id, func.count(Task.id).label("cnt"))
-            .filter(Task.stay_id.in_(stay_ids), Task.status == TaskStatus.OPEN)
-            .group_by(Task.stay_id)
-            .all()
-        )
-        open_tasks = {t.stay_id: t.cnt for t in tasks_count}
-
     results = []
     for c in conversations:
         state = determine_state(c.stay)
@@ -213,9 +200,9 @@ def list_conversations(
                 "current_handler": c.current_handler,
                 "created_at": c.created_at,
                 "updated_at": c.updated_at,
-                "last_message_text": last_messages.get(c.id),
+                "last_message_text": c.last_message_text,
                 "guest_state": state.value if hasattr(state, "value") else state,
-                "open_tasks_count": open_tasks.get(c.stay_id, 0) if c.stay_id else 0,
+                "open_tasks_count": c.open_tasks_count if c.stay_id else 0,
                 "guest_name": (c.guest.pii.full_name if c.guest and c.guest.pii else None),
                 "guest_phone": (c.guest.pii.phone_plain if c.guest and c.guest.pii else None),
                 "line_user_id": c.guest.line_user_id if c.guest else None,
@@ -245,28 +232,28 @@ def get_conversation(
     if not _user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    # Load messages and stay tasks with the conversation (IN-fan-out, no per-row queries)
     conversation = (
         db.query(Conversation)
         .filter(Conversation.id == conversation_id, Conversation.hotel_id == _user.hotel_id)
+        .options(
+            selectinload(Conversation.messages),
+            joinedload(Conversation.stay).options(joinedload(Stay.room), selectinload(Stay.tasks)),
+            joinedload(Conversation.guest).joinedload(Guest.pii),
+        )
         .first()
     )
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
-    messages = (
-        db.query(Message)
-        .filter(Message.conversation_id == conversation.id)
-        .order_by(Message.created_at.asc())
-        .all()
-    )
+    messages = sorted(conversation.messages, key=lambda m: m.created_at or datetime.min)
     state = determine_state(conversation.stay)
 
     tasks = []
-    if conversation.stay_id:
-        tasks = (
-            db.query(Task)
-            .filter(Task.stay_id == conversation.stay_id)
-            .order_by(Task.created_at.desc())
-            .all()
+    if conversation.stay:
+        tasks = sorted(
+            conversation.stay.tasks,
+            key=lambda t: t.created_at or datetime.min,
+            reverse=True,
         )
 
     return {
@@ -358,9 +345,25 @@ def list_tasks(
     ]
 
 
+def _send_system_message(hotel_id: int, recipient: str, text: str) -> None:
+    """Deliver a system message to the guest outside the request transaction."""
+    db = SessionLocal()
+    try:
+        hotel = db.get(Hotel, hotel_id)
+        if not hotel:
+            return
+        provider = get_message_provider(hotel)
+        provider.send_text(phone_number=recipient, message=text)
+    except Exception as e:
+        logger.error("Failed to send system message on pause toggle: %s", e)
+    finally:
+        db.close()
+
+
 @router.post("/conversations/{conversation_id}/toggle-pause")
 def toggle_pause(
     conversation_id: int,
+    background: BackgroundTasks,
     payload: dict = Body(...),
     db: Session = Depends(get_db),
     _user=Depends(require_staff),
@@ -378,14 +381,11 @@ def toggle_pause(
 
     conversation.is_bot_paused = paused
     conversation.current_handler = "STAFF" if paused else "BOT"
-    db.add(conversation)
-    db.commit()
-    db.refresh(conversation)
 
-    # Send system message to guest
+    # Build the system message in the same transaction as the pause flip
+    wa_id = None
+    system_msg = None
     try:
-        provider = get_message_provider(conversation.hotel)
-        wa_id = None
         # extract wa_id or line_user_id from last incoming
         last_incoming = (
             db.query(Message)
@@ -414,48 +414,39 @@ def toggle_pause(
             wa_id = conversation.guest.pii.phone_plain
 
         # Thai hotels (LINE) - ALWAYS bilingual TH/EN for all guests (staff needs to read too)
+        # Other hotels - use guest language
         hotel = conversation.hotel
         if hotel and hotel.staff_language == "th":
-            takeover_msg = (
-                "พนักงานได้เข้าร่วมการสนทนาแล้ว / A staff member has joined the conversation."
-            )
-            resume_msg = "การสนทนาได้กลับไปยังผู้ช่วยเสมือนแล้ว / The conversation has returned to the virtual assistant."
-            system_msg = takeover_msg if paused else resume_msg
+            lang = "th"
         else:
-            # Other hotels - use guest language
-            guest_lang = (
+            lang = (
                 (conversation.guest.preferred_language if conversation.guest else None)
                 or (hotel.staff_language if hotel else None)
                 or "en"
             )
-            takeover_msgs = {
-                "en": "A staff member has joined the conversation. You're now chatting directly with the hotel.",
-                "ro": "Un membru al echipei a intrat în conversație. Comunici direct cu hotelul acum.",
-            }
-            resume_msgs = {
-                "en": "The conversation has returned to the virtual assistant.",
-                "ro": "Conversația a revenit la asistentul virtual.",
-            }
-            system_msg = (
-                takeover_msgs.get(guest_lang, takeover_msgs["en"])
-                if paused
-                else resume_msgs.get(guest_lang, resume_msgs["en"])
-            )
-        if wa_id:
-            provider.send_text(phone_number=wa_id, message=system_msg)
+        msgs = _TAKEOVER_MSGS if paused else _RESUME_MSGS
+        system_msg = msgs.get(lang) or msgs["en"]
         # log in DB as STAFF outgoing
-        msg = Message(
-            conversation_id=conversation.id,
-            sender_type=MessageSender.STAFF,
-            direction=MessageDirection.OUTGOING,
-            text=system_msg,
+        db.add(
+            Message(
+                conversation_id=conversation.id,
+                sender_type=MessageSender.STAFF,
+                direction=MessageDirection.OUTGOING,
+                text=system_msg,
+            )
         )
-        db.add(msg)
-        db.commit()
     except Exception as e:
-        logger.error("Failed to send system message on pause toggle: %s", e)
+        logger.error("Failed to build system message on pause toggle: %s", e)
+        system_msg = None
+
+    db.add(conversation)
+    db.commit()
+
+    # Send to the guest after commit so provider latency stays off the transaction
+    if wa_id and system_msg:
+        background.add_task(_send_system_message, conversation.hotel_id, wa_id, system_msg)
 
-    return {"paused": conversation.is_bot_paused}
+    return {"paused": paused}
 
 
 @router.post("/conversations/{conversation_id}/send-message")
@@ -531,9 +522,21 @@ def send_manual_message(
     return {"sent": True}
 
 
+def _safe_log_task_done(hotel_id: int, task_id: int) -> None:
+    """Record the TASK_DONE usage event after the response has been sent."""
+    db = SessionLocal()
+    try:
+        log_task_done(db, hotel_id=hotel_id, metadata={"task_id": task_id})
+    except Exception as exc:
+        logger.warning("Failed to log task done for task %s: %s", task_id, exc)
+    finally:
+        db.close()
+
+
 @router.patch("/tasks/{task_id}")
 def mark_task_done(
     task_id: int,
+    background: BackgroundTasks,
     status: str = Body("DONE"),
     db: Session = Depends(get_db),
     _user=Depends(require_staff),
@@ -542,26 +545,38 @@ def mark_task_done(
     if not _user:
         raise HTTPException(status_code=401, detail="Unauthorized")
 
-    task = db.query(Task).filter(Task.id == task_id, Task.hotel_id == _user.hotel_id).first()
-    if not task:
-        raise HTTPException(status_code=404, detail="Task not found")
-
     status_value = (status or "DONE").upper()
     try:
         new_status = TaskStatus(status_value)
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid status")
 
+    # Row lock serializes concurrent staff clicks on the same task
+    task = (
+        db.query(Task)
+        .filter(Task.id == task_id, Task.hotel_id == _user.hotel_id)
+        .with_for_update(nowait=False)  # Wait for lock if another request is completing it
+        .first()
+    )
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if task.status == TaskStatus.DONE and new_status == TaskStatus.DONE:
+        # Already completed by a concurrent request - skip commit and analytics
+        return {
+            "id": task.id,
+            "status": task.status.value,
+            "completed_at": task.completed_at,
+        }
+
     task.status = new_status
     if new_status == TaskStatus.DONE:
         task.completed_at = datetime.now(timezone.utc)
     db.add(task)
     db.commit()
-    try:
-        log_task_done(db, hotel_id=task.hotel_id, metadata={"task_id": task.id})
-    except Exception as exc:
-        logger.warning("Failed to log task done for task %s: %s", task.id, exc)
     db.refresh(task)
+    if new_status == TaskStatus.DONE:
+        background.add_task(_safe_log_task_done, hotel_id=task.hotel_id, task_id=task.id)
     return {
         "id": task.id,
         "status": task.status.value if hasattr(task.status, "value") else task.status,
@@ -770,8 +785,10 @@ def gdpr_export_guest(
 </body>
 </html>"""
 
-    return HTMLResponse(
-        content=html_content,
+    # Encode once; GZipMiddleware compresses the repetitive markup on the wire
+    return Response(
+        content=html_content.encode("utf-8"),
+        media_type="text/html; charset=utf-8",
         headers={"Content-Disposition": f"attachment; filename=guest_{guest_id}_export.html"},
     )
 
@@ -808,6 +825,7 @@ def gdpr_delete_guest(
     # 2. Anonymize Guest identifiers
     guest.phone_hash = f"GDPR_DELETED_{guest_id}"
     guest.line_user_id = None
+    guest.is_deleted = True
     anonymized_count += 1
 
     # 3. Redact all messages for this guest's conversations
@@ -827,6 +845,9 @@ def gdpr_delete_guest(
             )
         )
         anonymized_count += msg_count
+        for c in conversations:
+            if c.last_message_text is not None:
+                c.last_message_text = "[deleted]"
 
     db.commit()
 
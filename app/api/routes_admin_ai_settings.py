@@ -1,16 +1,77 @@
-import tempfile
+import hashlib
+import threading
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile
-from pydantic import BaseModel
-from pypdf import PdfReader
+import pymupdf
+from fastapi import (
+    APIRouter,
+    Depends,
+    File,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.responses import ORJSONResponse
+from fastapi.routing import APIRoute
+from pydantic import BaseModel, field_validator
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 
 from app.api.routes_admin import require_staff
 from app.core.db import get_db
 from app.models import Hotel
-from app.services.hotel_settings import update_settings
+from app.services.hotel_documents import (
+    DOCUMENT_FIELDS,
+    get_document,
+    get_documents,
+    save_document,
+)
+from app.services.hotel_settings import get_setting, update_settings
 
-router = APIRouter(prefix="/api/admin/ai-settings", tags=["admin-ai-settings"])
+router = APIRouter(
+    prefix="/api/admin/ai-settings",
+    tags=["admin-ai-settings"],
+    default_response_class=ORJSONResponse,
+)
+
+
+# Hard cap so a tiny-but-huge (highly compressed) PDF cannot tie up a worker
+MAX_PDF_PAGES = 200
+UPLOAD_CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 2 * 1024 * 1024  # 2MB cap
+# Allowance for multipart boundaries/part headers on top of the file itself
+MULTIPART_OVERHEAD = 16 * 1024
+# Sniff the file header rather than trusting the filename extension
+PDF_MAGIC = b"%PDF-"
+_PDF_LOCK = threading.Lock()
+
+# Map UI tone values (incl. Romanian labels) to the canonical ai_profile format
+_TONE_MAP = {
+    "profesionistă": "professional",
+    "professional": "professional",
+    "prietenoasă": "friendly",
+    "friendly": "friendly",
+}
+
+# Settings payload key -> HotelAIProfile attribute (profile is the bot's source of truth)
+_SETTINGS_TO_PROFILE = {
+    "bot_name": "bot_name",
+    "wifi_ssid": "wifi_ssid",
+    "wifi_pass": "wifi_password",
+    "breakfast_hours": "breakfast_hours",
+    "parking_policy": "parking_info",
+}
+
+
+def _extract_pdf_text(raw: bytes) -> str:
+    """Extract text from an in-memory PDF (no temp file round-trip)."""
+    # MuPDF is not thread-safe, even across separate documents: extraction is
+    # serialized, which is fine since the C backend is far faster than pypdf was.
+    with _PDF_LOCK, pymupdf.open(stream=raw, filetype="pdf") as doc:
+        if doc.page_count > MAX_PDF_PAGES:
+            raise HTTPException(status_code=413, detail=f"Too many pages (max {MAX_PDF_PAGES}).")
+        # get_text() already terminates each page with a newline
+        return "".join(page.get_text() for page in doc)
 
 
 class AISettingsPayload(BaseModel):
@@ -43,17 +104,42 @@ class AISettingsPayload(BaseModel):
     qr_session_expiry_enabled: bool | None = None
     qr_session_hours: int | None = None
 
+    @field_validator("tone")
+    @classmethod
+    def _normalize_tone(cls, v: str | None) -> str | None:
+        # Store only canonical tone values so read paths never need the map
+        return _TONE_MAP.get(v, v) if v is not None else v
+
+
+def _settings_etag(hotel: Hotel) -> str:
+    # Every settings/document write bumps hotel.updated_at, so it versions the whole payload
+    stamp = f"{hotel.id}:{hotel.updated_at.isoformat() if hotel.updated_at else ''}"
+    return '"%s"' % hashlib.blake2b(stamp.encode(), digest_size=8).hexdigest()
+
 
 @router.get("/")
-def get_ai_settings(db: Session = Depends(get_db), staff=Depends(require_staff)):
-    hotel: Hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+def get_ai_settings(
+    request: Request,
+    db: Session = Depends(get_db),
+    staff=Depends(require_staff),
+):
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
-    # Include hotel name in response for welcome preview
-    response = hotel.settings.copy() if hotel.settings else {}
-    response["hotel_name"] = hotel.name or "Hotel"
-    response["subscription_tier"] = hotel.subscription_tier or "free"
-    return response
+    etag = _settings_etag(hotel)
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers={"ETag": etag})
+    # Include hotel name in response for welcome preview; large texts live in
+    # hotel_document but the UI textareas still expect them here
+    content = {
+        **(hotel.settings or {}),
+        "hotel_name": hotel.name or "Hotel",
+        "subscription_tier": hotel.subscription_tier or "free",
+        **get_documents(db, hotel),
+    }
+    # Let the browser cache the body but always revalidate
+    return ORJSONResponse(content, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 
 @router.put("/")
@@ -62,10 +148,10 @@ def update_ai_settings(
     db: Session = Depends(get_db),
     staff=Depends(require_staff),
 ):
-    hotel: Hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
-    updates = payload.dict(exclude_none=True)
+    updates = payload.model_dump(exclude_none=True)
     if not updates.get("guest_languages"):
         updates["guest_languages"] = ["auto"]
     if updates.get("staff_language") == "":
@@ -75,114 +161,130 @@ def update_ai_settings(
         updates["wifi_password"] = updates["wifi_pass"]
     if "parking_policy" in updates:
         updates["parking_info"] = updates["parking_policy"]
+    documents = {field: updates.pop(field) for field in DOCUMENT_FIELDS if field in updates}
     update_settings(hotel, updates)
+    for field, content in documents.items():
+        save_document(db, hotel, field, content)
+    # Keep a reference to the merged dict: it is what we just wrote, so no refresh needed
+    saved_settings = hotel.settings
 
     # Sync to hotel.ai_profile (single source of truth for bot personality)
     if hotel.ai_profile:
-        if "bot_name" in updates:
-            hotel.ai_profile.bot_name = updates["bot_name"]
+        for src, dst in _SETTINGS_TO_PROFILE.items():
+            if src in updates:
+                setattr(hotel.ai_profile, dst, updates[src])
         if "tone" in updates:
-            # Map UI tone values to ai_profile format
-            tone_map = {
-                "profesionistă": "professional",
-                "professional": "professional",
-                "prietenoasă": "friendly",
-                "friendly": "friendly",
-            }
-            hotel.ai_profile.tone = tone_map.get(updates["tone"], updates["tone"])
-        if "wifi_ssid" in updates:
-            hotel.ai_profile.wifi_ssid = updates["wifi_ssid"]
-        if "wifi_pass" in updates:
-            hotel.ai_profile.wifi_password = updates["wifi_pass"]
-        if "breakfast_hours" in updates:
-            hotel.ai_profile.breakfast_hours = updates["breakfast_hours"]
-        if "parking_policy" in updates:
-            hotel.ai_profile.parking_info = updates["parking_policy"]
-        db.add(hotel.ai_profile)
-
-    db.add(hotel)
+            hotel.ai_profile.tone = updates["tone"]  # already canonical (see validator)
+
+    # hotel and ai_profile are already tracked by the session - one commit flushes both
     db.commit()
-    db.refresh(hotel)
-    return hotel.settings or {}
+    return {**(saved_settings or {}), **documents}
 
 
-@router.post("/upload-knowledge")
-def upload_knowledge(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-    staff=Depends(require_staff),
-):
-    hotel: Hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+def _decode_text(raw: bytes) -> str:
+    """Decode a text upload as UTF-8, falling back to latin-1 (never drops bytes)."""
+    try:
+        return raw.decode("utf-8")
+    except UnicodeDecodeError:
+        return raw.decode("latin-1")
+
+
+def _is_pdf(raw: bytes, filename: str) -> bool:
+    if raw[:5] == PDF_MAGIC:
+        return True
+    # Some writers put junk before the header (readers accept it within the first 1KB);
+    # only look for it when the name says .pdf. rpartition avoids lowercasing the whole name.
+    return filename.rpartition(".")[2].lower() == "pdf" and PDF_MAGIC in raw[:1024]
+
+
+async def _iter_chunks(file: UploadFile, size: int = UPLOAD_CHUNK_SIZE):
+    while chunk := await file.read(size):
+        yield chunk
+
+
+async def _read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an upload in chunks, aborting as soon as it exceeds max_bytes."""
+    buf = bytearray()
+    async for chunk in _iter_chunks(file):
+        buf += chunk
+        if len(buf) > max_bytes:
+            raise HTTPException(status_code=400, detail="File too large (max 2MB).")
+    return bytes(buf)
+
+
+def _save_document(db: Session, hotel: Hotel, field: str, content: str, upload_sha256: str) -> None:
+    save_document(db, hotel, field, content, upload_sha256)
+    db.commit()
+
+
+class _UploadRoute(APIRoute):
+    """Rejects oversized uploads from Content-Length before FastAPI reads the form body."""
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            length = request.headers.get("content-length")
+            if length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="File too large (max 2MB).")
+            return await handler(request)
+
+        return route_handler
+
+
+async def _ingest_document(hotel: Hotel, db: Session, file: UploadFile, settings_key: str):
+    """Extract text from an uploaded PDF/text file and store it as a hotel document."""
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
-    filename = file.filename or ""
     content = ""
-    max_bytes = 2 * 1024 * 1024  # 2MB cap
+    # Post-read check still applies to chunked uploads without Content-Length
+    raw_content = await _read_upload(file, MAX_UPLOAD_BYTES)
+    upload_sha256 = hashlib.sha256(raw_content).hexdigest()
+    kind = DOCUMENT_FIELDS[settings_key]
+    if get_setting(hotel, f"{kind}_upload_sha256") == upload_sha256:
+        # Same file as last time: skip parsing and the DB write, hand back the stored text
+        content = await run_in_threadpool(get_document, hotel, settings_key)
+        return {"ok": True, "unchanged": True, "extracted_text": content, "length": len(content)}
     try:
-        raw_content = file.file.read(max_bytes + 1)
-        if len(raw_content) > max_bytes:
-            raise HTTPException(status_code=400, detail="File too large (max 2MB).")
-        if filename.lower().endswith(".pdf"):
-            with tempfile.NamedTemporaryFile(delete=True) as tmp:  # ✅ Auto-cleanup
-                tmp.write(raw_content)
-                tmp.flush()
-                reader = PdfReader(tmp.name)
-                pages = [page.extract_text() or "" for page in reader.pages]
-                content = "\n".join(pages)
+        if _is_pdf(raw_content, file.filename or ""):
+            # PDF parsing is CPU-bound - keep it off the event loop
+            content = await run_in_threadpool(_extract_pdf_text, raw_content)
         else:
             # treat as text
-            content = raw_content.decode(errors="ignore")
+            content = _decode_text(raw_content)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to process file: {e}")
     content = content.strip()
     if not content:
         raise HTTPException(status_code=400, detail="No text could be extracted from the file.")
-    current = hotel.settings or {}
     # Replace content entirely (no concatenation to avoid duplicates)
-    current["custom_knowledge_text"] = content
-    update_settings(hotel, current)
-    db.add(hotel)
-    db.commit()
-    db.refresh(hotel)
+    await run_in_threadpool(_save_document, db, hotel, settings_key, content, upload_sha256)
     return {"ok": True, "extracted_text": content, "length": len(content)}
 
 
-@router.post("/upload-products")
-def upload_products(
+async def upload_knowledge(
     file: UploadFile = File(...),
     db: Session = Depends(get_db),
     staff=Depends(require_staff),
 ):
-    hotel: Hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
-    if not hotel:
-        raise HTTPException(status_code=404, detail="Hotel not found")
-    filename = file.filename or ""
-    content = ""
-    max_bytes = 2 * 1024 * 1024  # 2MB cap
-    try:
-        raw_content = file.file.read(max_bytes + 1)
-        if len(raw_content) > max_bytes:
-            raise HTTPException(status_code=400, detail="File too large (max 2MB).")
-        if filename.lower().endswith(".pdf"):
-            with tempfile.NamedTemporaryFile(delete=True) as tmp:  # ✅ Auto-cleanup
-                tmp.write(raw_content)
-                tmp.flush()
-                reader = PdfReader(tmp.name)
-                pages = [page.extract_text() or "" for page in reader.pages]
-                content = "\n".join(pages)
-        else:
-            # treat as text
-            content = raw_content.decode(errors="ignore")
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"Failed to process file: {e}")
-    content = content.strip()
-    if not content:
-        raise HTTPException(status_code=400, detail="No text could be extracted from the file.")
-    current = hotel.settings or {}
-    # Replace content entirely (no concatenation to avoid duplicates)
-    current["hotel_products_text"] = content
-    update_settings(hotel, current)
-    db.add(hotel)
-    db.commit()
-    db.refresh(hotel)
-    return {"ok": True, "extracted_text": content, "length": len(content)}
+    # staff.hotel is eager-loaded by require_staff
+    return await _ingest_document(staff.hotel, db, file, "custom_knowledge_text")
+
+
+async def upload_products(
+    file: UploadFile = File(...),
+    db: Session = Depends(get_db),
+    staff=Depends(require_staff),
+):
+    return await _ingest_document(staff.hotel, db, file, "hotel_products_text")
+
+
+# Registered explicitly: the decorator form cannot take a per-route route class
+router.add_api_route(
+    "/upload-knowledge", upload_knowledge, methods=["POST"], route_class_override=_UploadRoute
+)
+router.add_api_route(
+    "/upload-products", upload_products, methods=["POST"], route_class_override=_UploadRoute
+)
@@ -1,16 +1,31 @@
 import logging
 import secrets
-from typing import Optional
-
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from itertools import islice, product
+from typing import Any, Callable, Optional
+
+import httpx
+import orjson
+import requests
 from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.routing import APIRoute
 from linebot import LineBotApi
+from linebot.http_client import RequestsHttpClient, RequestsHttpResponse
 from pydantic import BaseModel
+from requests.adapters import HTTPAdapter
 from sqlalchemy.orm import Session
 from sqlalchemy.orm.attributes import flag_modified
+from starlette.concurrency import run_in_threadpool
+from urllib3.util.retry import Retry
 
 from app.api.routes_admin import require_staff
 from app.core.config import get_settings
 from app.core.db import get_db
+from app.core.security import _redis as redis_client
+from app.core.security import verify_password as check_password
 from app.models import Hotel, Journey, StaffUser
 from app.services.messaging.line_setup import setup_line_webhook
 from app.services.pms.apaleo_client import ApaleoClient
@@ -18,6 +33,61 @@ from app.services.pms.cloudbeds_client import CloudbedsClient
 from app.services.pms.mews_client import MewsClient
 
 logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# Shared keep-alive session for the (blocking) LINE SDK (avoids a TCP+TLS handshake per call)
+_HTTP = requests.Session()
+_HTTP.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=10, pool_maxsize=20, max_retries=Retry(total=2, backoff_factor=0.2)
+    ),
+)
+
+# Pooled async client for Meta Graph probes, so a slow Graph call doesn't hold a worker thread
+_ASYNC_HTTP = httpx.AsyncClient(
+    timeout=10.0,
+    limits=httpx.Limits(max_connections=50),
+    transport=httpx.AsyncHTTPTransport(retries=2),
+)
+
+
+class _SessionHttpClient(RequestsHttpClient):
+    """LINE SDK http client that goes through the shared keep-alive session."""
+
+    def get(self, url, headers=None, params=None, stream=False, timeout=None):
+        response = _HTTP.get(
+            url, headers=headers, params=params, stream=stream, timeout=timeout or self.timeout
+        )
+        return RequestsHttpResponse(response)
+
+    def post(self, url, headers=None, data=None, timeout=None):
+        response = _HTTP.post(url, headers=headers, data=data, timeout=timeout or self.timeout)
+        return RequestsHttpResponse(response)
+
+
+@lru_cache(maxsize=256)
+def _line_client(access_token: str) -> LineBotApi:
+    # Tokens are opaque strings, so they are a safe cache key
+    return LineBotApi(access_token, http_client=_SessionHttpClient)
+
+
+# GET /integrations is polled by the dashboard; cache the serialized payload per hotel
+INTEGRATIONS_CACHE_TTL = 30  # seconds
+
+
+def _integrations_cache_key(hotel_id: int) -> str:
+    return f"integrations:{hotel_id}"
+
+
+def invalidate_integrations_cache(hotel_id: int) -> None:
+    """Drop cached GET /integrations payloads for a hotel (best-effort)."""
+    if not redis_client:
+        return
+    try:
+        redis_client.delete(_integrations_cache_key(hotel_id))
+    except Exception as exc:
+        logger.warning(f"Failed to invalidate integrations cache for hotel {hotel_id}: {exc}")
 
 
 def _ensure_default_journeys(db: Session, hotel_id: int) -> None:
@@ -41,17 +111,17 @@ def _ensure_default_journeys(db: Session, hotel_id: int) -> None:
         # },
     ]
 
-    for journey_def in default_journeys:
-        existing = (
-            db.query(Journey)
-            .filter(
-                Journey.hotel_id == hotel_id,
-                Journey.name == journey_def["name"],
-            )
-            .first()
-        )
+    # One round-trip for all definitions instead of a SELECT per journey
+    names = [journey_def["name"] for journey_def in default_journeys]
+    existing_names = {
+        name
+        for (name,) in db.query(Journey.name)
+        .filter(Journey.hotel_id == hotel_id, Journey.name.in_(names))
+        .all()
+    }
 
-        if not existing:
+    for journey_def in default_journeys:
+        if journey_def["name"] not in existing_names:
             journey = Journey(
                 hotel_id=hotel_id,
                 name=journey_def["name"],
@@ -65,6 +135,28 @@ def _ensure_default_journeys(db: Session, hotel_id: int) -> None:
     db.commit()
 
 
+_DISCONNECTED = ("disconnected", "disconnected", "Not configured", False)
+_CUSTOM_LINE = ("custom_line", "active", "LINE connected with custom credentials.", False)
+_CUSTOM_META = ("custom_meta", "active", "WhatsApp connected with custom credentials.", False)
+_PLATFORM_DEFAULT = ("platform_default", "active", "Using platform default WhatsApp number.", True)
+
+# (provider, has_line_custom, has_wa_custom, has_platform_default) -> (mode, status, message, locked)
+# Custom credentials win over the platform default; anything not listed is disconnected.
+_STATUS_TABLE = {
+    ("line", True, has_wa, has_platform): _CUSTOM_LINE
+    for has_wa, has_platform in product((False, True), repeat=2)
+}
+_STATUS_TABLE.update(
+    {
+        ("meta", has_line, True, has_platform): _CUSTOM_META
+        for has_line, has_platform in product((False, True), repeat=2)
+    }
+)
+_STATUS_TABLE.update(
+    {("meta", has_line, False, True): _PLATFORM_DEFAULT for has_line in (False, True)}
+)
+
+
 def _compute_connection_status(hotel, settings_obj):
     settings_dict = hotel.settings or {}
     provider = settings_dict.get("messaging_provider", "meta")
@@ -74,43 +166,126 @@ def _compute_connection_status(hotel, settings_obj):
     has_line_custom = bool(
         settings_dict.get("line_channel_access_token") and settings_dict.get("line_channel_secret")
     )
-    locked_flag = settings_dict.get("messaging_locked", False)
-
-    mode = "disconnected"
-    locked = False
-    status = "disconnected"
-    message = "Not configured"
-    if provider == "line" and has_line_custom:
-        mode = "custom_line"
-        status = "active"
-        message = "LINE connected with custom credentials."
-    elif provider == "meta" and has_wa_custom:
-        mode = "custom_meta"
-        status = "active"
-        message = "WhatsApp connected with custom credentials."
-    elif (
-        provider == "meta"
-        and settings_obj.whatsapp_access_token
-        and settings_obj.whatsapp_phone_number_id
-    ):
-        mode = "platform_default"
-        status = "active"
-        message = "Using platform default WhatsApp number."
-        locked = True
-
-    if locked_flag:
-        locked = True
+    has_platform_default = bool(
+        settings_obj.whatsapp_access_token and settings_obj.whatsapp_phone_number_id
+    )
+
+    key = (provider, has_line_custom, has_wa_custom, has_platform_default)
+    mode, status, message, locked = _STATUS_TABLE.get(key, _DISCONNECTED)
 
     return {
         "provider": provider,
         "mode": mode,
         "status": status,
-        "locked": locked,
+        "locked": locked or bool(settings_dict.get("messaging_locked", False)),
         "message": message,
     }
 
 
-router = APIRouter(prefix="/api/admin", tags=["admin-integrations"])
+def _mask(val: str | None) -> str | None:
+    if not val:
+        return None
+    if len(val) <= 4:
+        return "****"
+    return "****" + val[-4:]
+
+
+# Settings secrets masked as-is (no platform fallback) -> response field
+_MASKED_SETTINGS = (
+    ("whatsapp_business_account_id", "whatsapp_business_account_id_masked"),
+    ("line_channel_secret", "line_channel_secret_masked"),
+    ("line_channel_access_token", "line_channel_access_token_masked"),
+)
+
+
+def _build_integrations_response(hotel: Hotel, staff: StaffUser, request: Request) -> dict:
+    """Response payload shared by GET and PUT /integrations (secrets masked)."""
+    pms_configured = bool(hotel.pms_type and hotel.pms_api_key and hotel.pms_property_id)
+
+    # WhatsApp is globally managed - check if global credentials exist
+    whatsapp_configured = bool(settings.whatsapp_access_token and settings.whatsapp_phone_number_id)
+    hotel_settings = hotel.settings or {}
+    # Read each settings key once and share it between masking, webhook URLs and BYON checks
+    wa_token = hotel_settings.get("whatsapp_access_token")
+    provider = hotel_settings.get("messaging_provider", "meta")
+
+    wa_token_masked = _mask(wa_token or settings.whatsapp_access_token)
+    wa_phone_masked = _mask(
+        hotel_settings.get("whatsapp_phone_id")
+        or hotel_settings.get("whatsapp_phone_number_id")
+        or settings.whatsapp_phone_number_id
+    )
+
+    base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
+
+    # LINE webhook URL
+    line_webhook_url = f"{base_url}/webhook/line/{hotel.id}" if provider == "line" else None
+
+    # WhatsApp BYON: webhook URL and verify token (only if BYON configured)
+    has_wa_byon = bool(wa_token)
+    wa_webhook_url = f"{base_url}/webhook/whatsapp/{hotel.id}" if has_wa_byon else None
+    wa_verify_token = hotel_settings.get("whatsapp_verify_token") if has_wa_byon else None
+
+    # Cloudbeds OAuth: check if connected
+    cloudbeds_connected = bool(
+        hotel.pms_type == "cloudbeds" and hotel_settings.get("cloudbeds_access_token")
+    )
+    cloudbeds_property_id = (
+        hotel_settings.get("cloudbeds_property_id") if cloudbeds_connected else None
+    )
+
+    return {
+        "hotel_id": hotel.id,
+        "pms_type": hotel.pms_type,
+        "pms_property_id": hotel.pms_property_id,
+        "pms_configured": pms_configured,
+        "cloudbeds_connected": cloudbeds_connected,
+        "cloudbeds_property_id": cloudbeds_property_id,
+        "whatsapp_phone_id": settings.whatsapp_phone_number_id,
+        "whatsapp_business_account_id": None,  # Not used in global model
+        "whatsapp_configured": whatsapp_configured,
+        "messaging_provider": provider,
+        "whatsapp_access_token_masked": wa_token_masked,
+        "whatsapp_phone_id_masked": wa_phone_masked,
+        "whatsapp_verify_token": wa_verify_token,
+        "whatsapp_webhook_url": wa_webhook_url,
+        "whatsapp_phone_number": settings.whatsapp_phone_number,
+        "line_webhook_url": line_webhook_url,
+        "connection_status": _compute_connection_status(hotel, settings),
+        "messaging_locked": hotel_settings.get("messaging_locked", False),
+        "staff_role": staff.role,
+        "security_pin_required": bool(hotel.security_pin),
+        **{field: _mask(hotel_settings.get(key)) for key, field in _MASKED_SETTINGS},
+    }
+
+
+class _OrjsonRequest(Request):
+    """Request whose JSON body is parsed with orjson instead of the stdlib json module."""
+
+    async def json(self) -> Any:
+        if not hasattr(self, "_json"):
+            # orjson.JSONDecodeError subclasses json.JSONDecodeError, so FastAPI still
+            # turns malformed bodies into its usual 422 response
+            self._json = orjson.loads(await self.body())
+        return self._json
+
+
+class _OrjsonRoute(APIRoute):
+    def get_route_handler(self) -> Callable:
+        handler = super().get_route_handler()
+
+        async def orjson_route_handler(request: Request) -> Response:
+            return await handler(_OrjsonRequest(request.scope, request.receive))
+
+        return orjson_route_handler
+
+
+router = APIRouter(
+    prefix="/api/admin",
+    tags=["admin-integrations"],
+    default_response_class=ORJSONResponse,
+    route_class=_OrjsonRoute,
+)
 
 
 class AdminIntegrationsGetResponse(BaseModel):
@@ -138,9 +313,6 @@ class AdminIntegrationsGetResponse(BaseModel):
     staff_role: str | None = None
     security_pin_required: bool | None = None
 
-    class Config:
-        orm_mode = True
-
 
 class LineQrResponse(BaseModel):
     qr_url: str
@@ -160,97 +332,52 @@ class AdminIntegrationsUpdateRequest(BaseModel):
     messaging_locked: bool | None = None
 
 
-@router.get("/integrations", response_model=AdminIntegrationsGetResponse)
+# Responses are built from trusted server-side data and serialized straight to JSON;
+# the schemas are kept for the OpenAPI docs only (no response-side validation). The
+# line-qr and generate-qr-token routes declare their models the same way.
+_INTEGRATIONS_RESPONSES = {200: {"model": AdminIntegrationsGetResponse}}
+
+
+@router.get("/integrations", responses=_INTEGRATIONS_RESPONSES)
 def get_integrations(
     request: Request,
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
-):
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+) -> Any:
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
-    pms_configured = bool(hotel.pms_type and hotel.pms_api_key and hotel.pms_property_id)
-
-    # WhatsApp is globally managed - check if global credentials exist
-    settings = get_settings()
-    whatsapp_configured = bool(settings.whatsapp_access_token and settings.whatsapp_phone_number_id)
-    hotel_settings = hotel.settings or {}
-
-    def _mask(val: str | None) -> str | None:
-        if not val:
-            return None
-        if len(val) <= 4:
-            return "****"
-        return "****" + val[-4:]
-
-    wa_token_masked = _mask(
-        hotel_settings.get("whatsapp_access_token") or settings.whatsapp_access_token
-    )
-    wa_phone_masked = _mask(
-        hotel_settings.get("whatsapp_phone_id")
-        or hotel_settings.get("whatsapp_phone_number_id")
-        or settings.whatsapp_phone_number_id
-    )
-    line_secret_masked = _mask(hotel_settings.get("line_channel_secret"))
-    line_token_masked = _mask(hotel_settings.get("line_channel_access_token"))
-    wa_business_id_masked = _mask(hotel_settings.get("whatsapp_business_account_id"))
-
-    base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
-
-    # LINE webhook URL
-    line_webhook_url = (
-        f"{base_url}/webhook/line/{hotel.id}"
-        if (hotel.settings or {}).get("messaging_provider") == "line"
-        else None
-    )
-
-    # WhatsApp BYON: webhook URL and verify token (only if BYON configured)
-    has_wa_byon = bool(hotel_settings.get("whatsapp_access_token"))
-    wa_webhook_url = f"{base_url}/webhook/whatsapp/{hotel.id}" if has_wa_byon else None
-    wa_verify_token = hotel_settings.get("whatsapp_verify_token") if has_wa_byon else None
-
-    # Cloudbeds OAuth: check if connected
-    cloudbeds_connected = bool(
-        hotel.pms_type == "cloudbeds" and hotel_settings.get("cloudbeds_access_token")
-    )
-    cloudbeds_property_id = (
-        hotel_settings.get("cloudbeds_property_id") if cloudbeds_connected else None
-    )
-
-    return AdminIntegrationsGetResponse(
-        hotel_id=hotel.id,
-        pms_type=hotel.pms_type,
-        pms_property_id=hotel.pms_property_id,
-        pms_configured=pms_configured,
-        cloudbeds_connected=cloudbeds_connected,
-        cloudbeds_property_id=cloudbeds_property_id,
-        whatsapp_phone_id=settings.whatsapp_phone_number_id,
-        whatsapp_business_account_id=None,  # Not used in global model
-        whatsapp_configured=whatsapp_configured,
-        messaging_provider=(hotel.settings or {}).get("messaging_provider", "meta"),
-        whatsapp_access_token_masked=wa_token_masked,
-        whatsapp_phone_id_masked=wa_phone_masked,
-        whatsapp_business_account_id_masked=wa_business_id_masked,
-        whatsapp_verify_token=wa_verify_token,
-        whatsapp_webhook_url=wa_webhook_url,
-        whatsapp_phone_number=settings.whatsapp_phone_number,
-        line_channel_secret_masked=line_secret_masked,
-        line_channel_access_token_masked=line_token_masked,
-        line_webhook_url=line_webhook_url,
-        connection_status=_compute_connection_status(hotel, settings),
-        messaging_locked=(hotel.settings or {}).get("messaging_locked", False),
-        staff_role=staff.role,
-        security_pin_required=bool(hotel.security_pin),
-    )
+    # One hash per hotel; the payload varies by staff role and (without a configured
+    # public URL) by request host, so those form the field
+    cache_key = _integrations_cache_key(hotel.id)
+    cache_field = f"{staff.role}|{request.base_url}"
+    if redis_client:
+        try:
+            cached = redis_client.hget(cache_key, cache_field)
+            if cached:
+                return Response(content=cached, media_type="application/json")
+        except Exception as exc:
+            logger.warning(f"Integrations cache read failed for hotel {hotel.id}: {exc}")
+
+    response = ORJSONResponse(_build_integrations_response(hotel, staff, request))
+    if redis_client:
+        try:
+            pipe = redis_client.pipeline()
+            pipe.hset(cache_key, cache_field, response.body)
+            pipe.expire(cache_key, INTEGRATIONS_CACHE_TTL)
+            pipe.execute()
+        except Exception as exc:
+            logger.warning(f"Integrations cache write failed for hotel {hotel.id}: {exc}")
+    return response
 
 
-@router.get("/integrations/line-qr", response_model=LineQrResponse)
+@router.get("/integrations/line-qr", responses={200: {"model": LineQrResponse}})
 def get_line_qr(
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
 ):
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -260,17 +387,17 @@ def get_line_qr(
     cached_basic_id = settings_dict.get("line_basic_id")
     if cached_basic_id:
         qr_url = f"https://qr-official.line.me/sid/L/{cached_basic_id.lstrip('@')}.png"
-        return LineQrResponse(qr_url=qr_url, basic_id=cached_basic_id)
+        return LineQrResponse.model_construct(qr_url=qr_url, basic_id=cached_basic_id)
 
     # Fallback: call LINE API
     access_token = (
-        settings_dict.get("line_channel_access_token") or get_settings().line_channel_access_token
+        settings_dict.get("line_channel_access_token") or settings.line_channel_access_token
     )
     if not access_token:
         raise HTTPException(status_code=400, detail="LINE not configured for this hotel.")
 
     try:
-        client = LineBotApi(access_token)
+        client = _line_client(access_token)
         info = client.get_bot_info()
         basic_id = getattr(info, "basic_id", None) or getattr(info, "basicId", None)
         if not basic_id:
@@ -284,21 +411,21 @@ def get_line_qr(
         db.commit()
 
         qr_url = f"https://qr-official.line.me/sid/L/{basic_id.lstrip('@')}.png"
-        return LineQrResponse(qr_url=qr_url, basic_id=basic_id)
+        return LineQrResponse.model_construct(qr_url=qr_url, basic_id=basic_id)
     except HTTPException:
         raise
     except Exception as exc:
         raise HTTPException(status_code=400, detail=f"Failed to fetch LINE bot info: {exc}")
 
 
-@router.put("/integrations", response_model=AdminIntegrationsGetResponse)
+@router.put("/integrations", responses=_INTEGRATIONS_RESPONSES)
 def update_integrations(
     payload: AdminIntegrationsUpdateRequest,
     request: Request,
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
-):
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+) -> Any:
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -310,7 +437,10 @@ def update_integrations(
     if payload.pms_property_id is not None:
         hotel.pms_property_id = payload.pms_property_id
 
-    settings_dict = dict(hotel.settings or {})
+    # Mutated in place; flag_modified below marks the JSON column dirty
+    if hotel.settings is None:
+        hotel.settings = {}
+    settings_dict = hotel.settings
 
     # Normalize provider and update messaging settings (BYOC)
     provider = (
@@ -319,6 +449,7 @@ def update_integrations(
     has_line_payload = bool(payload.line_channel_secret or payload.line_channel_access_token)
     if has_line_payload:
         provider = "line"
+        _line_client.cache_clear()  # drop clients holding replaced tokens
     if provider not in {"meta", "line", "twilio"}:
         provider = "meta"
 
@@ -354,88 +485,31 @@ def update_integrations(
         settings_dict.pop("line_channel_secret", None)
         settings_dict.pop("line_channel_access_token", None)
 
-    hotel.settings = settings_dict
     flag_modified(hotel, "settings")
 
-    db.commit()
-    db.refresh(hotel)
-
     pms_configured = bool(hotel.pms_type and hotel.pms_api_key and hotel.pms_property_id)
+    # Build the response from the state we are about to commit: commit() expires every
+    # attribute, so reading them afterwards would reload hotel and staff (no refresh needed)
+    response = _build_integrations_response(hotel, staff, request)
+    hotel_id = hotel.id
+    db.commit()
+    invalidate_integrations_cache(hotel_id)
 
     # Auto-create default Journeys when PMS is configured
     if pms_configured:
         try:
-            _ensure_default_journeys(db, hotel.id)
-            logger.info(f"Ensured default journeys exist for hotel {hotel.id}")
+            _ensure_default_journeys(db, hotel_id)
+            logger.info(f"Ensured default journeys exist for hotel {hotel_id}")
         except Exception as e:
-            logger.error(f"Failed to create default journeys for hotel {hotel.id}: {e}")
-
-    # WhatsApp is globally managed - check global credentials
-    settings = get_settings()
-    whatsapp_configured = bool(settings.whatsapp_access_token and settings.whatsapp_phone_number_id)
-    base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
+            logger.error(f"Failed to create default journeys for hotel {hotel_id}: {e}")
 
     # Auto-wire LINE if creds provided
-    hotel_settings = hotel.settings or {}
-    if provider == "line" and hotel_settings.get("line_channel_access_token"):
-        success, _warn = setup_line_webhook(
-            hotel.id, hotel_settings.get("line_channel_access_token"), base_url=base_url
-        )
-
-    # Use same masking function as GET endpoint for consistency
-    def _mask(val: str | None) -> str | None:
-        if not val:
-            return None
-        if len(val) <= 4:
-            return "****"
-        return "****" + val[-4:]
+    line_token = settings_dict.get("line_channel_access_token")
+    if provider == "line" and line_token:
+        base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
+        success, _warn = setup_line_webhook(hotel_id, line_token, base_url=base_url)
 
-    wa_token_masked = _mask(hotel_settings.get("whatsapp_access_token"))
-    wa_phone_masked = _mask(
-        hotel_settings.get("whatsapp_phone_id") or hotel_settings.get("whatsapp_phone_number_id")
-    )
-    line_secret_masked = _mask(hotel_settings.get("line_channel_secret"))
-    line_token_masked = _mask(hotel_settings.get("line_channel_access_token"))
-    wa_business_id_masked = _mask(hotel_settings.get("whatsapp_business_account_id"))
-
-    # WhatsApp BYON: webhook URL and verify token
-    has_wa_byon = bool(hotel_settings.get("whatsapp_access_token"))
-    wa_webhook_url = f"{base_url}/webhook/whatsapp/{hotel.id}" if has_wa_byon else None
-    wa_verify_token = hotel_settings.get("whatsapp_verify_token") if has_wa_byon else None
-
-    # Cloudbeds OAuth: check if connected
-    cloudbeds_connected = bool(
-        hotel.pms_type == "cloudbeds" and hotel_settings.get("cloudbeds_access_token")
-    )
-    cloudbeds_property_id = (
-        hotel_settings.get("cloudbeds_property_id") if cloudbeds_connected else None
-    )
-
-    return AdminIntegrationsGetResponse(
-        hotel_id=hotel.id,
-        pms_type=hotel.pms_type,
-        pms_property_id=hotel.pms_property_id,
-        pms_configured=pms_configured,
-        cloudbeds_connected=cloudbeds_connected,
-        cloudbeds_property_id=cloudbeds_property_id,
-        whatsapp_phone_id=settings.whatsapp_phone_number_id,
-        whatsapp_business_account_id=None,
-        whatsapp_configured=whatsapp_configured,
-        messaging_provider=(hotel.settings or {}).get("messaging_provider", "meta"),
-        whatsapp_access_token_masked=wa_token_masked,
-        whatsapp_phone_id_masked=wa_phone_masked,
-        whatsapp_business_account_id_masked=wa_business_id_masked,
-        whatsapp_verify_token=wa_verify_token,
-        whatsapp_webhook_url=wa_webhook_url,
-        whatsapp_phone_number=settings.whatsapp_phone_number,
-        line_channel_secret_masked=line_secret_masked,
-        line_channel_access_token_masked=line_token_masked,
-        line_webhook_url=f"{base_url}/webhook/line/{hotel.id}",
-        connection_status=_compute_connection_status(hotel, settings),
-        messaging_locked=(hotel.settings or {}).get("messaging_locked", False),
-        staff_role=staff.role,
-        security_pin_required=bool(hotel.security_pin),
-    )
+    return ORJSONResponse(response)
 
 
 class VerifyPasswordRequest(BaseModel):
@@ -449,13 +523,26 @@ def verify_password(
     staff: StaffUser = Depends(require_staff),
 ):
     """Verify staff password to unlock sensitive settings."""
-    from app.core.security import verify_password as check_password
-
     if check_password(payload.password, staff.password_hash):
         return {"success": True}
     raise HTTPException(status_code=400, detail="Incorrect password")
 
 
+@dataclass(slots=True)
+class _TempHotel:
+    """Hotel stand-in carrying unsaved PMS credentials into a PMS client."""
+
+    id: int
+    pms_type: str
+    pms_property_id: str
+    pms_api_key: str
+    settings: dict | None = None  # read (and refreshed) by CloudbedsClient
+
+
+# PMS types that can be connection-tested -> client class
+_PMS_CLIENTS = {"mews": MewsClient, "cloudbeds": CloudbedsClient, "apaleo": ApaleoClient}
+
+
 class TestPmsPayload(BaseModel):
     """Payload for testing PMS connection with unsaved credentials."""
 
@@ -476,7 +563,7 @@ def test_pms_connection(
     If payload contains credentials, test with those (unsaved).
     Otherwise, test with stored credentials from DB.
     """
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -497,28 +584,17 @@ def test_pms_connection(
         }
 
     # Create a temporary hotel-like object for testing
-    class TempHotel:
-        def __init__(self, hotel_id, pms_type, pms_property_id, pms_api_key):
-            self.id = hotel_id
-            self.pms_type = pms_type
-            self.pms_property_id = pms_property_id
-            self.pms_api_key = pms_api_key
-
-    temp_hotel = TempHotel(hotel.id, pms_type, pms_property_id, pms_api_key)
+    temp_hotel = _TempHotel(hotel.id, pms_type, pms_property_id, pms_api_key)
 
     # Get appropriate PMS client
     try:
-        if pms_type.lower() == "mews":
-            client = MewsClient(temp_hotel)
-        elif pms_type.lower() == "cloudbeds":
-            client = CloudbedsClient(temp_hotel)
-        elif pms_type.lower() == "apaleo":
-            client = ApaleoClient(temp_hotel)
-        else:
+        client_cls = _PMS_CLIENTS.get(pms_type.lower())
+        if client_cls is None:
             return {
                 "success": False,
-                "message": f"PMS type '{pms_type}' is not yet supported. Supported: mews, cloudbeds, apaleo.",
+                "message": f"PMS type '{pms_type}' is not yet supported. Supported: {', '.join(_PMS_CLIENTS)}.",
             }
+        client = client_cls(temp_hotel)
 
         # Test the connection
         success = client.test_connection()
@@ -556,7 +632,7 @@ class LineTestRequest(BaseModel):
 
 
 @router.post("/integrations/test-line")
-def test_line_connection(
+async def test_line_connection(
     request_body: LineTestRequest = None,
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
@@ -567,7 +643,7 @@ def test_line_connection(
     If credentials are provided in request body (from form), test those directly.
     Otherwise, fall back to stored credentials in database.
     """
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -589,9 +665,9 @@ def test_line_connection(
 
     # Final fallback to global settings
     if not access_token:
-        access_token = get_settings().line_channel_access_token
+        access_token = settings.line_channel_access_token
     if not channel_secret:
-        channel_secret = get_settings().line_channel_secret
+        channel_secret = settings.line_channel_secret
 
     if not access_token or not channel_secret:
         return {
@@ -600,8 +676,9 @@ def test_line_connection(
         }
 
     try:
-        client = LineBotApi(access_token)
-        info = client.get_bot_info()
+        client = _line_client(access_token)
+        # line-bot-sdk is blocking; keep the event loop free while LINE answers
+        info = await run_in_threadpool(client.get_bot_info)
         basic_id = getattr(info, "basic_id", None) or getattr(info, "basicId", None)
         display_name = (
             getattr(info, "display_name", None) or getattr(info, "displayName", None) or "LINE Bot"
@@ -613,7 +690,7 @@ def test_line_connection(
                 hotel.settings = {}
             hotel.settings = {**hotel.settings, "line_basic_id": basic_id}
             flag_modified(hotel, "settings")
-            db.commit()
+            await run_in_threadpool(db.commit)
 
         return {
             "success": True,
@@ -638,48 +715,46 @@ class GenerateQrTokenResponse(BaseModel):
     room_number: str
 
 
-@router.post("/integrations/generate-qr-token", response_model=GenerateQrTokenResponse)
+@router.post("/integrations/generate-qr-token", responses={200: {"model": GenerateQrTokenResponse}})
 def generate_qr_token(
     payload: GenerateQrTokenRequest,
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
 ):
     """Generate a unique QR token for a room. Used to prevent QR code spoofing."""
-    from datetime import datetime, timezone
-
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
     if not hotel.settings:
         hotel.settings = {}
 
-    settings_dict = dict(hotel.settings)
-    qr_tokens = dict(settings_dict.get("qr_tokens", {}))
+    # Mutate the stored token map in place instead of copying up to 500 entries;
+    # flag_modified below marks the JSON column dirty
+    qr_tokens = hotel.settings.setdefault("qr_tokens", {})
 
     # Enforce max 500 tokens per hotel — remove oldest if at limit
     if len(qr_tokens) >= 500:
-        sorted_tokens = sorted(qr_tokens.items(), key=lambda x: x[1].get("created_at", ""))
-        # Remove oldest 50 to make room
-        for tok, _ in sorted_tokens[:50]:
+        # Insertion order is creation order (dicts and the JSON column both keep it),
+        # so the oldest 50 are simply the first 50 keys - no sort needed
+        for tok in list(islice(qr_tokens, 50)):
             del qr_tokens[tok]
 
-    # Generate unique 6-char hex token (0-9a-f only, no ambiguous chars)
-    token = secrets.token_hex(3)
-    while token in qr_tokens:
-        token = secrets.token_hex(3)
+    # 12-char hex token (48 bits, 0-9a-f only so the "!token" webhook regexes still match).
+    # With at most 500 live tokens a collision is ~1e-12, so no retry loop
+    token = secrets.token_hex(6)
+    if token in qr_tokens:
+        raise HTTPException(status_code=409, detail="Token collision, please retry")
 
     qr_tokens[token] = {
         "room": payload.room_number,
         "created_at": datetime.now(timezone.utc).isoformat(),
     }
 
-    settings_dict["qr_tokens"] = qr_tokens
-    hotel.settings = settings_dict
     flag_modified(hotel, "settings")
     db.commit()
 
-    return GenerateQrTokenResponse(token=token, room_number=payload.room_number)
+    return GenerateQrTokenResponse.model_construct(token=token, room_number=payload.room_number)
 
 
 class WhatsAppTestRequest(BaseModel):
@@ -691,7 +766,7 @@ class WhatsAppTestRequest(BaseModel):
 
 
 @router.post("/integrations/test-whatsapp")
-def test_whatsapp_connection(
+async def test_whatsapp_connection(
     request_body: WhatsAppTestRequest = None,
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
@@ -702,9 +777,7 @@ def test_whatsapp_connection(
     If credentials are provided in request body (from form), test those directly.
     Otherwise, fall back to stored credentials in database.
     """
-    import requests
-
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel: Hotel = staff.hotel  # eager-loaded by require_staff
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -737,7 +810,7 @@ def test_whatsapp_connection(
     headers = {"Authorization": f"Bearer {access_token}"}
 
     try:
-        response = requests.get(url, headers=headers, timeout=10)
+        response = await _ASYNC_HTTP.get(url, headers=headers)
         response.raise_for_status()
         data = response.json()
         display_name = data.get("verified_name") or data.get("display_phone_number") or "Connected"
@@ -745,9 +818,9 @@ def test_whatsapp_connection(
             "success": True,
             "message": f"Connected! Phone: {display_name}",
         }
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         error_msg = str(e)
-        if hasattr(e, "response") and e.response is not None:
+        if isinstance(e, httpx.HTTPStatusError):
             try:
                 error_data = e.response.json()
                 error_msg = error_data.get("error", {}).get("message", str(e))
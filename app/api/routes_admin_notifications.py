@@ -1,14 +1,32 @@
+import json
+import logging
 from datetime import datetime, timezone
 from typing import Optional
 
 from fastapi import APIRouter, Depends, Query
+from fastapi.responses import ORJSONResponse
+from sqlalchemy import case, func
 from sqlalchemy.orm import Session
 
 from app.api.routes_admin import require_staff
 from app.core.db import get_db
+from app.core.security import _redis as redis_client
 from app.models import Conversation, Task
 
-router = APIRouter(prefix="/api/admin/notifications", tags=["admin-notifications"])
+logger = logging.getLogger(__name__)
+
+router = APIRouter(
+    prefix="/api/admin/notifications",
+    tags=["admin-notifications"],
+    default_response_class=ORJSONResponse,
+)
+
+# Each poll counts a closed window (since, until] with until = now floored to the bucket.
+# The client sends server_time (= until) back as its next last_check, so windows never
+# overlap or leave gaps, and a closed window's counts don't change: every staff session
+# of a hotel polling within the same bucket shares one cached result, no invalidation.
+NOTIFICATIONS_BUCKET_SECONDS = 5
+NOTIFICATIONS_CACHE_TTL = 10  # seconds
 
 
 def _parse_ts(value: Optional[str]) -> Optional[datetime]:
@@ -23,61 +41,100 @@ def _parse_ts(value: Optional[str]) -> Optional[datetime]:
         return None
 
 
+def _floor_to_bucket(ts: datetime) -> datetime:
+    seconds = int(ts.timestamp()) // NOTIFICATIONS_BUCKET_SECONDS * NOTIFICATIONS_BUCKET_SECONDS
+    return datetime.fromtimestamp(seconds, tz=timezone.utc)
+
+
+def _count_new(
+    db: Session, hotel_id: int, since: datetime, until: datetime
+) -> tuple[int, int, int, int]:
+    """(new tasks, critical, urgent, handoffs) created/updated in (since, until]."""
+    # One scan over the new tasks: total plus per-priority counts (anything that isn't
+    # CRITICAL or URGENT counts as NORMAL)
+    priority = func.upper(Task.priority)
+    new_tasks_count, critical_count, urgent_count = (
+        db.query(
+            func.count(Task.id),
+            func.count(case((priority == "CRITICAL", 1))),
+            func.count(case((priority == "URGENT", 1))),
+        )
+        .filter(Task.hotel_id == hotel_id, Task.created_at > since, Task.created_at <= until)
+        .one()
+    )
+
+    # func.count() scalar instead of Query.count(), which wraps the SELECT in a subquery
+    new_handoff_count = (
+        db.query(func.count(Conversation.id))
+        .filter(
+            Conversation.hotel_id == hotel_id,
+            Conversation.current_handler == "STAFF",
+            Conversation.updated_at > since,
+            Conversation.updated_at <= until,
+        )
+        .scalar()
+    )
+    return new_tasks_count, critical_count, urgent_count, new_handoff_count
+
+
+def _cached_count_new(
+    db: Session, hotel_id: int, since: datetime, until: datetime
+) -> tuple[int, int, int, int]:
+    """_count_new behind a short Redis cache (best-effort: falls back to the DB)."""
+    cache_key = f"notif:{hotel_id}:{int(since.timestamp())}:{int(until.timestamp())}"
+    if redis_client:
+        try:
+            cached = redis_client.get(cache_key)
+            if cached:
+                return tuple(json.loads(cached))
+        except Exception as exc:
+            logger.warning(f"Notifications cache read failed for hotel {hotel_id}: {exc}")
+
+    counts = _count_new(db, hotel_id, since, until)
+    if redis_client:
+        try:
+            redis_client.setex(cache_key, NOTIFICATIONS_CACHE_TTL, json.dumps(counts))
+        except Exception as exc:
+            logger.warning(f"Notifications cache write failed for hotel {hotel_id}: {exc}")
+    return counts
+
+
 @router.get("/check")
 def check_notifications(
     last_check: Optional[str] = Query(None),
     db: Session = Depends(get_db),
     staff=Depends(require_staff),
 ):
-    now = datetime.now(timezone.utc)
+    until = _floor_to_bucket(datetime.now(timezone.utc))
+    empty = {
+        "has_new": False,
+        "new_tasks_count": 0,
+        "new_handoff_count": 0,
+        "server_time": until,
+    }
     if not staff:
-        return {
-            "has_new": False,
-            "new_tasks_count": 0,
-            "new_handoff_count": 0,
-            "server_time": now.isoformat(),
-        }
+        return ORJSONResponse(empty)
 
     since = _parse_ts(last_check)
     if not since:
-        return {
-            "has_new": False,
-            "new_tasks_count": 0,
-            "new_handoff_count": 0,
-            "server_time": now.isoformat(),
-        }
+        return ORJSONResponse(empty)
+    since = _floor_to_bucket(since)
+    if since >= until:
+        return ORJSONResponse(empty)  # polled again within the same bucket
 
-    new_tasks_count = (
-        db.query(Task).filter(Task.hotel_id == staff.hotel_id, Task.created_at > since).count()
+    new_tasks_count, critical_count, urgent_count, new_handoff_count = _cached_count_new(
+        db, staff.hotel_id, since, until
     )
-    priority_rows = (
-        db.query(Task.priority)
-        .filter(Task.hotel_id == staff.hotel_id, Task.created_at > since)
-        .all()
-    )
-    priority_counts = {"CRITICAL": 0, "URGENT": 0, "NORMAL": 0}
-    for (priority,) in priority_rows:
-        key = (priority or "NORMAL").upper()
-        if key not in priority_counts:
-            key = "NORMAL"
-        priority_counts[key] += 1
 
-    new_handoff_count = (
-        db.query(Conversation)
-        .filter(
-            Conversation.hotel_id == staff.hotel_id,
-            Conversation.updated_at > since,
-            Conversation.current_handler == "STAFF",
-        )
-        .count()
+    # Returned directly so orjson serializes server_time natively (no jsonable_encoder pass).
+    return ORJSONResponse(
+        {
+            "has_new": (new_tasks_count + new_handoff_count) > 0,
+            "new_tasks_count": new_tasks_count,
+            "new_critical_count": critical_count,
+            "new_urgent_count": urgent_count,
+            "new_normal_count": new_tasks_count - critical_count - urgent_count,
+            "new_handoff_count": new_handoff_count,
+            "server_time": until,
+        }
     )
-
-    return {
-        "has_new": (new_tasks_count + new_handoff_count) > 0,
-        "new_tasks_count": new_tasks_count,
-        "new_critical_count": priority_counts["CRITICAL"],
-        "new_urgent_count": priority_counts["URGENT"],
-        "new_normal_count": priority_counts["NORMAL"],
-        "new_handoff_count": new_handoff_count,
-        "server_time": now.isoformat(),
-    }
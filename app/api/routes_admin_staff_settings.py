@@ -4,7 +4,7 @@ from sqlalchemy.orm import Session
 
 from app.api.routes_admin import require_staff
 from app.core.db import get_db
-from app.models import Hotel, StaffUser
+from app.models import StaffUser
 
 router = APIRouter(prefix="/api/admin", tags=["admin-staff-settings"])
 
@@ -24,7 +24,7 @@ def get_staff_settings(
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
 ):
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel = staff.hotel  # eager-loaded by require_staff
     return StaffSettingsResponse(
         staff_language=hotel.staff_language,
         staff_alert_phone=hotel.staff_alert_phone,
@@ -37,15 +37,15 @@ def update_staff_settings(
     db: Session = Depends(get_db),
     staff: StaffUser = Depends(require_staff),
 ):
-    hotel = db.query(Hotel).filter(Hotel.id == staff.hotel_id).first()
+    hotel = staff.hotel  # eager-loaded by require_staff, tracked by this session
     if payload.staff_language is not None:
         hotel.staff_language = payload.staff_language
     if payload.staff_alert_phone is not None:
         hotel.staff_alert_phone = payload.staff_alert_phone
-    db.add(hotel)
-    db.commit()
-    db.refresh(hotel)
-    return StaffSettingsResponse(
+    # Build the response from the in-memory values before commit() expires them
+    response = StaffSettingsResponse(
         staff_language=hotel.staff_language,
         staff_alert_phone=hotel.staff_alert_phone,
     )
+    db.commit()
+    return response
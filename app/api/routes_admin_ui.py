@@ -12,6 +12,7 @@ from app.core.security import (
     create_access_token,
     decode_access_token,
     get_bearer_token,
+    set_admin_cookie,
 )
 from app.models import StaffUser
 
@@ -20,6 +21,14 @@ settings = get_settings()
 
 TEMPLATES_DIR = Path(__file__).resolve().parents[2] / "templates"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+# Templates only change on deploy; skip the per-render mtime check outside development.
+templates.env.auto_reload = settings.environment == "development"
+
+
+def precompile_templates() -> None:
+    """Compile the admin templates into the Jinja cache so first hits don't pay for it."""
+    for path in sorted((TEMPLATES_DIR / "admin").glob("*.html")):
+        templates.env.get_template(f"admin/{path.name}")
 
 
 def _render(request: Request, template_name: str):
@@ -72,16 +81,7 @@ def admin_integrations_page(request: Request, code: str = None, auth=Depends(_re
                     url="/ui/admin/settings/integrations?cloudbeds_connected=1",
                     status_code=303,
                 )
-                secure_cookie = settings.environment == "production"
-                response.set_cookie(
-                    key="admin_token",
-                    value=token_str,
-                    httponly=True,
-                    secure=secure_cookie,
-                    samesite="lax",
-                    max_age=5184000,
-                    path="/",
-                )
+                set_admin_cookie(response, token_str)
                 return response
         return auth
     return _render(request, "integrations.html")
@@ -130,15 +130,6 @@ def login_page(request: Request, code: str = None, db: Session = Depends(get_db)
             if staff:
                 token = create_access_token(user_id=staff.id, email=staff.email)
                 response = RedirectResponse(url="/ui/admin/tasks", status_code=303)
-                secure_cookie = settings.environment == "production"
-                response.set_cookie(
-                    key="admin_token",
-                    value=token,
-                    httponly=True,
-                    secure=secure_cookie,
-                    samesite="lax",
-                    max_age=5184000,
-                    path="/",
-                )
+                set_admin_cookie(response, token)
                 return response
     return _render(request, "login.html")
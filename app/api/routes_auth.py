@@ -1,21 +1,32 @@
+import hashlib
+import json
+import time
 import uuid
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 
 import resend
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
+from jinja2 import Environment, FileSystemLoader
 from pydantic import BaseModel, constr
-from sqlalchemy.orm import Session
+from sqlalchemy import delete, lambda_stmt, select, update
+from sqlalchemy.orm import Session, joinedload
 
 from app.core.config import get_settings
 from app.core.db import get_db
 from app.core.logging import logger
+from app.core.security import (
+    DUMMY_PASSWORD_HASH,
+)
+from app.core.security import _redis as redis_client
 from app.core.security import (
     create_access_token,
     decode_access_token,
     get_bearer_token,
     hash_password,
     rate_limit,
+    set_admin_cookie,
     verify_password,
 )
 from app.models import Hotel, PasswordResetToken, PlatformOwner, StaffUser
@@ -23,6 +34,11 @@ from app.models import Hotel, PasswordResetToken, PlatformOwner, StaffUser
 router = APIRouter(prefix="/auth", tags=["auth"])
 settings = get_settings()
 
+AUTH_CACHE_TTL = 60  # seconds; /auth/me may lag a deactivation by up to this long
+
+TEMPLATES_DIR = Path(__file__).resolve().parents[2] / "templates"
+_email_env = Environment(loader=FileSystemLoader(str(TEMPLATES_DIR)), autoescape=True)
+
 
 class LoginRequest(BaseModel):
     email: str
@@ -58,12 +74,17 @@ def _require_auth(request: Request, db: Session = Depends(get_db)) -> StaffUser:
         payload = decode_access_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
-
-    user = (
-        db.query(StaffUser)
-        .filter(StaffUser.id == int(payload.get("sub")), StaffUser.is_active == True)  # noqa: E712
-        .first()
-    )
+    request.state.jwt_payload = payload  # reused by callers instead of decoding again
+
+    user_id = int(payload.get("sub"))
+    # lambda_stmt: the statement is built and compiled once, later calls only bind user_id
+    user = db.execute(
+        lambda_stmt(
+            lambda: select(StaffUser).where(
+                StaffUser.id == user_id, StaffUser.is_active == True  # noqa: E712
+            )
+        )
+    ).scalar_one_or_none()
 
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
@@ -71,16 +92,76 @@ def _require_auth(request: Request, db: Session = Depends(get_db)) -> StaffUser:
     return user
 
 
+def _auth_cache_key(token: str) -> str:
+    return f"auth:{hashlib.sha256(token.encode()).hexdigest()[:32]}"
+
+
+def _invalidate_auth_cache(user_id: int) -> None:
+    """Drop cached /auth/me payloads for every token of a user (best-effort)."""
+    if not redis_client:
+        return
+    index_key = f"auth_tokens:{user_id}"
+    try:
+        keys = redis_client.smembers(index_key)
+        redis_client.delete(index_key, *keys)
+    except Exception as exc:
+        logger.warning("Failed to invalidate auth cache for user %s: %s", user_id, exc)
+
+
+def _current_user_info(request: Request, db: Session = Depends(get_db)) -> dict:
+    """Read-only view of the current user, cached per token so polling skips JWT + DB."""
+    token = get_bearer_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Unauthorized")
+
+    cache_key = _auth_cache_key(token)
+    if redis_client:
+        try:
+            cached = redis_client.get(cache_key)
+            if cached:
+                return json.loads(cached)
+        except Exception as exc:
+            logger.warning("Auth cache read failed: %s", exc)
+
+    user = _require_auth(request, db)
+    info = {
+        "id": user.id,
+        "email": user.email,
+        "name": user.name,
+        "hotel_id": user.hotel_id,
+        "must_change_password": getattr(user, "must_change_password", False),
+    }
+    # Never serve a cached entry past the token's own expiry
+    ttl = min(AUTH_CACHE_TTL, int(request.state.jwt_payload.get("exp", 0) - time.time()))
+    if redis_client and ttl > 0:
+        try:
+            index_key = f"auth_tokens:{user.id}"
+            pipe = redis_client.pipeline()
+            pipe.setex(cache_key, ttl, json.dumps(info))
+            pipe.sadd(index_key, cache_key)
+            pipe.expire(index_key, AUTH_CACHE_TTL)
+            pipe.execute()
+        except Exception as exc:
+            logger.warning("Auth cache write failed for user %s: %s", user.id, exc)
+    return info
+
+
 @router.post("/login")
 def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)):
     rate_limit(f"login:{request.client.host}", limit=5, window_seconds=60)
 
-    user = (
-        db.query(StaffUser)
-        .filter(StaffUser.email == payload.email, StaffUser.is_active == True)
-        .first()
-    )  # noqa: E712
-    if not user or not verify_password(payload.password, user.password_hash):
+    # Load the hotel in the same query; the response needs its country and language.
+    # lambda_stmt caches the built statement, so later logins only bind the email
+    email = payload.email
+    user = db.execute(
+        lambda_stmt(
+            lambda: select(StaffUser)
+            .options(joinedload(StaffUser.hotel))
+            .where(StaffUser.email == email, StaffUser.is_active == True)  # noqa: E712
+        )
+    ).scalar_one_or_none()
+    password_hash = user.password_hash if user else DUMMY_PASSWORD_HASH
+    if not verify_password(payload.password, password_hash) or not user:
         logger.info("Login failed for email %s from %s", payload.email, request.client.host)
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
@@ -88,7 +169,7 @@ def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)
     logger.info("Login success for email %s from %s", payload.email, request.client.host)
 
     # Get hotel info for frontend
-    hotel = db.query(Hotel).filter(Hotel.id == user.hotel_id).first()
+    hotel = user.hotel
 
     response_content = {
         "access_token": token,
@@ -101,34 +182,15 @@ def login(payload: LoginRequest, request: Request, db: Session = Depends(get_db)
     response = JSONResponse(content=response_content)
 
     # Secure HttpOnly Cookie
-    secure_cookie = settings.environment == "production"
-    response.set_cookie(
-        key="admin_token",
-        value=token,
-        httponly=True,
-        secure=secure_cookie,
-        samesite="lax",
-        max_age=5184000,
-        path="/",
-    )
+    set_admin_cookie(response, token)
 
     return response
 
 
 @router.get("/me")
-def get_current_user(
-    request: Request,
-    db: Session = Depends(get_db),
-    user: StaffUser = Depends(_require_auth),
-):
+def get_current_user(user_info: dict = Depends(_current_user_info)):
     """Get the current authenticated user's information."""
-    return {
-        "id": user.id,
-        "email": user.email,
-        "name": user.name,
-        "hotel_id": user.hotel_id,
-        "must_change_password": getattr(user, "must_change_password", False),
-    }
+    return user_info
 
 
 @router.put("/change-password")
@@ -145,10 +207,11 @@ def change_password(
 
     # Update to new password
     user.password_hash = hash_password(payload.new_password)
-    db.add(user)
-    db.commit()
+    user_id, email = user.id, user.email  # read before commit() expires the instance
+    db.commit()  # user is already tracked by the session; no add() needed
+    _invalidate_auth_cache(user_id)
 
-    logger.info("Password changed for user %s from %s", user.email, request.client.host)
+    logger.info("Password changed for user %s from %s", email, request.client.host)
 
     return {"success": True, "message": "Password changed successfully"}
 
@@ -163,12 +226,30 @@ def change_password_force(
     """Force password change flow (no current password), marks must_change_password=False."""
     user.password_hash = hash_password(payload.new_password)
     user.must_change_password = False
-    db.add(user)
+    user_id, email = user.id, user.email  # read before commit() expires the instance
     db.commit()
-    logger.info("Forced password change for user %s from %s", user.email, request.client.host)
+    _invalidate_auth_cache(user_id)
+    logger.info("Forced password change for user %s from %s", email, request.client.host)
     return {"success": True}
 
 
+RESET_EMAIL_TEMPLATES = {
+    "en": {
+        "subject": "Reset Your Password - AI Hotel Suite",
+        "title": "Password Reset",
+        "intro": "We received a request to reset your password.",
+        "instruction": "Click the button below to set a new password:",
+        "button": "Reset Password",
+        "expires": "This link expires in 1 hour.",
+        "ignore": "If you didn't request this, you can safely ignore this email.",
+        "footer": "Questions? Contact us at",
+    }
+}
+
+# Compiled once at import; Jinja keeps the template cached
+_RESET_EMAIL_TEMPLATE = _email_env.get_template("emails/reset_password.html")
+
+
 def _send_email(to_email: str, subject: str, body: str):
     api_key = settings.resend_api_key
     if not api_key:
@@ -190,10 +271,14 @@ def _send_email(to_email: str, subject: str, body: str):
 
 @router.post("/forgot-password")
 def forgot_password(
-    payload: ForgotPasswordRequest, request: Request, db: Session = Depends(get_db)
+    payload: ForgotPasswordRequest,
+    request: Request,
+    background: BackgroundTasks,
+    db: Session = Depends(get_db),
 ):
     rate_limit(f"forgot:{request.client.host}", limit=3, window_seconds=3600)
     target_user = None
+    language = None
     user_type = payload.user_type or "staff"
     if user_type == "owner":
         target_user = (
@@ -202,16 +287,22 @@ def forgot_password(
             .first()
         )  # noqa: E712
     else:
-        target_user = (
-            db.query(StaffUser)
+        # Fetch the hotel's interface language in the same round trip
+        row = (
+            db.query(StaffUser, Hotel.interface_language)
+            .outerjoin(Hotel, Hotel.id == StaffUser.hotel_id)
             .filter(StaffUser.email == payload.email, StaffUser.is_active == True)
             .first()
         )  # noqa: E712
+        if row:
+            target_user, language = row
 
     if not target_user:
         # Do not reveal existence
         return {"success": True}
 
+    to_email = target_user.email  # read before commit() expires the instance
+
     token_value = str(uuid.uuid4())
     expires_at = datetime.now(timezone.utc) + timedelta(hours=1)
     reset = PasswordResetToken(
@@ -225,112 +316,47 @@ def forgot_password(
 
     reset_link = f"{settings.public_api_base_url or ''}/ui/{'owner' if user_type == 'owner' else 'admin'}/reset-password?token={token_value}"
 
-    RESET_EMAIL_TEMPLATES = {
-        "en": {
-            "subject": "Reset Your Password - AI Hotel Suite",
-            "title": "Password Reset",
-            "intro": "We received a request to reset your password.",
-            "instruction": "Click the button below to set a new password:",
-            "button": "Reset Password",
-            "expires": "This link expires in 1 hour.",
-            "ignore": "If you didn't request this, you can safely ignore this email.",
-            "footer": "Questions? Contact us at",
-        }
-    }
-
-    # Get language from user's hotel or default to English
-    language = "en"
-    if hasattr(target_user, "hotel_id") and target_user.hotel_id:
-        hotel = db.query(Hotel).filter(Hotel.id == target_user.hotel_id).first()
-        if hotel and hotel.interface_language:
-            language = hotel.interface_language
-
-    tpl = RESET_EMAIL_TEMPLATES.get(language, RESET_EMAIL_TEMPLATES["en"])
+    # Use the hotel's interface language, default to English
+    tpl = RESET_EMAIL_TEMPLATES.get(language or "en", RESET_EMAIL_TEMPLATES["en"])
     contact_email = "support@yourdomain.com"
 
-    body = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <link href="https://fonts.googleapis.com/css2?family=Inter:wght@400;500;600;700&display=swap" rel="stylesheet">
-    </head>
-    <body style="margin:0; padding:0; font-family: 'Inter', -apple-system, BlinkMacSystemFont, sans-serif; background-color: #fafaf9;">
-        <div style="max-width: 600px; margin: 0 auto; padding: 40px 20px;">
-            <!-- Header -->
-            <div style="text-align: center; margin-bottom: 30px;">
-                <img src="https://yourdomain.com/static/logo.png" alt="AI Hotel Suite" style="height: 48px; width: auto; border-radius: 10px;">
-                <p style="color: #1c1917; font-size: 20px; font-weight: 600; margin: 12px 0 0 0;">AI Hotel Suite</p>
-            </div>
-
-            <!-- Main Card -->
-            <div style="background: white; border-radius: 16px; padding: 40px; border: 1px solid #e7e5e4;">
-                <h1 style="color: #1c1917; margin: 0 0 20px 0; font-size: 24px; text-align: center; font-weight: 600;">
-                    {tpl['title']}
-                </h1>
-
-                <p style="color: #78716c; font-size: 16px; line-height: 1.6; text-align: center;">
-                    {tpl['intro']}
-                </p>
-
-                <p style="color: #57534e; font-size: 15px; line-height: 1.6; text-align: center; margin: 25px 0;">
-                    {tpl['instruction']}
-                </p>
-
-                <!-- CTA Button -->
-                <div style="text-align: center; margin: 30px 0;">
-                    <a href="{reset_link}"
-                       style="display: inline-block; background: #1c1917; color: #fafaf9;
-                              padding: 14px 36px; border-radius: 10px; text-decoration: none;
-                              font-weight: 600; font-size: 15px;">
-                        {tpl['button']} →
-                    </a>
-                </div>
-
-                <!-- Expiry Notice -->
-                <p style="color: #57534e; font-size: 14px; text-align: center; margin: 20px 0 0 0;
-                          background: #f5f5f4; padding: 12px; border-radius: 8px; border: 1px solid #e7e5e4;">
-                    {tpl['expires']}
-                </p>
-
-                <p style="color: #a8a29e; font-size: 13px; text-align: center; margin-top: 20px;">
-                    {tpl['ignore']}
-                </p>
-            </div>
-
-            <!-- Footer -->
-            <div style="text-align: center; margin-top: 30px;">
-                <p style="color: #a8a29e; font-size: 13px; margin-bottom: 10px;">
-                    {tpl['footer']} <a href="mailto:{contact_email}" style="color: #1c1917;">{contact_email}</a>
-                </p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-
-    _send_email(target_user.email, tpl["subject"], body)
+    body = _RESET_EMAIL_TEMPLATE.render(tpl=tpl, reset_link=reset_link, contact_email=contact_email)
+
+    # Resend is a blocking HTTPS call; deliver after the response has been sent
+    background.add_task(_send_email, to_email, tpl["subject"], body)
     return {"success": True}
 
 
 @router.post("/reset-password")
 def reset_password(payload: ResetPasswordRequest, db: Session = Depends(get_db)):
-    reset = db.query(PasswordResetToken).filter(PasswordResetToken.token == payload.token).first()
-    if not reset or reset.expires_at < datetime.now(timezone.utc):
+    # Consume the token in one statement: a concurrent second use finds nothing to delete.
+    # If the user is gone we raise before commit, so the rollback keeps the token.
+    consumed = db.execute(
+        delete(PasswordResetToken)
+        .where(
+            PasswordResetToken.token == payload.token,
+            PasswordResetToken.expires_at >= datetime.now(timezone.utc),
+        )
+        .returning(PasswordResetToken.user_type, PasswordResetToken.user_id)
+    ).first()
+    if not consumed:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
 
-    if reset.user_type == "owner":
-        user = db.query(PlatformOwner).filter(PlatformOwner.id == reset.user_id).first()
-    else:
-        user = db.query(StaffUser).filter(StaffUser.id == reset.user_id).first()
-    if not user:
+    user_type, user_id = consumed
+    is_staff = user_type != "owner"
+    values = {"password_hash": hash_password(payload.new_password)}
+    if is_staff:
+        values["must_change_password"] = False
+    model = StaffUser if is_staff else PlatformOwner
+    updated = db.execute(
+        update(model)
+        .where(model.id == user_id)
+        .values(**values)
+        .execution_options(synchronize_session=False)
+    )
+    if not updated.rowcount:
         raise HTTPException(status_code=404, detail="User not found")
-
-    user.password_hash = hash_password(payload.new_password)
-    if hasattr(user, "must_change_password"):
-        user.must_change_password = False
-    db.add(user)
-    db.delete(reset)
     db.commit()
+    if is_staff:
+        _invalidate_auth_cache(user_id)
     return {"success": True}
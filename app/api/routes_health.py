@@ -1,45 +1,65 @@
+import asyncio
+import time
+
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import ORJSONResponse
 from sqlalchemy import text
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 
-from app.core.db import get_db
+from app.core.db import get_async_db
 from app.workers.queue import redis_conn
 
-router = APIRouter()
+router = APIRouter(default_response_class=ORJSONResponse)
 
 
 @router.get("/health")
-def healthcheck():
+async def healthcheck():
     """Basic liveness check - returns 200 if API is running."""
     return {"status": "ok"}
 
 
+# A passing readiness result is reused for this long, so frequent probes (k8s, load
+# balancer, docker healthcheck) don't each hold a DB connection and ping Redis.
+# Failures are never cached: the next probe re-checks so recovery shows up at once.
+READY_CACHE_SECONDS = 5.0
+_last_ready: float | None = None  # time.monotonic() of the last passing check
+
+
+async def _check_db(db: AsyncSession) -> None:
+    await db.execute(text("SELECT 1"))
+
+
+async def _check_redis() -> None:
+    await run_in_threadpool(redis_conn.ping)  # sync client (shared with RQ)
+
+
 @router.get("/health/ready")
-def readiness_check(db: Session = Depends(get_db)):
+async def readiness_check(db: AsyncSession = Depends(get_async_db)):
     """
     Readiness check - verifies all dependencies are available.
     Returns 200 if DB and Redis are responsive, 503 otherwise.
     """
-    errors = []
+    global _last_ready
+    if _last_ready is not None and time.monotonic() - _last_ready < READY_CACHE_SECONDS:
+        return {"status": "ready", "db": "ok", "redis": "ok"}
 
-    # Check database
-    try:
-        db.execute(text("SELECT 1"))
-        db_status = "ok"
-    except Exception as e:
+    # Independent checks: run them concurrently so latency is max(db, redis), not the sum
+    db_error, redis_error = await asyncio.gather(
+        _check_db(db), _check_redis(), return_exceptions=True
+    )
+    errors = []
+    db_status = redis_status = "ok"
+    if db_error:
         db_status = "failed"
-        errors.append(f"Database: {str(e)}")
-
-    # Check Redis
-    try:
-        redis_conn.ping()
-        redis_status = "ok"
-    except Exception as e:
+        errors.append(f"Database: {str(db_error)}")
+    if redis_error:
         redis_status = "failed"
-        errors.append(f"Redis: {str(e)}")
+        errors.append(f"Redis: {str(redis_error)}")
 
     # Return 503 if any dependency failed
     if errors:
+        _last_ready = None
         raise HTTPException(
             status_code=503,
             detail={
@@ -50,4 +70,5 @@ def readiness_check(db: Session = Depends(get_db)):
             },
         )
 
+    _last_ready = time.monotonic()
     return {"status": "ready", "db": db_status, "redis": redis_status}
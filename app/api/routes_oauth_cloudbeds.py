@@ -1,48 +1,197 @@
 """OAuth 2.0 routes for Cloudbeds PMS integration."""
 
-import json
+import asyncio
+import base64
+import hashlib
+import hmac
 import logging
 import secrets
+import time
 from urllib.parse import quote, urlencode
 
 import httpx
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, Request
 from fastapi.responses import RedirectResponse
+from sqlalchemy import Text, case, cast, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from starlette.concurrency import run_in_threadpool
 
 from app.api.routes_admin import require_staff
-from app.api.routes_admin_integrations import _ensure_default_journeys
+from app.api.routes_admin_integrations import (
+    _ensure_default_journeys,
+    invalidate_integrations_cache,
+)
 from app.core.config import get_settings
-from app.core.db import get_db
-from app.core.security import _redis as redis_client
+from app.core.db import get_async_db, get_db
+from app.core.security import _async_redis as redis_client
 from app.models import Hotel, StaffUser
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/oauth/cloudbeds", tags=["oauth"])
+settings = get_settings()
 
 # Cloudbeds OAuth endpoints
 CLOUDBEDS_AUTH_URL = "https://hotels.cloudbeds.com/api/v1.1/oauth"
 CLOUDBEDS_TOKEN_URL = "https://hotels.cloudbeds.com/api/v1.1/access_token"
+CLOUDBEDS_SCOPE = "read:reservation read:guest"
+
+# Shared keep-alive client: token exchanges/refreshes reuse the pooled TLS connection
+# to hotels.cloudbeds.com instead of a fresh handshake per call.
+_CLOUDBEDS_HTTP = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=5.0),
+    limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+)
+
+
+# hotel.settings keys owned by the Cloudbeds OAuth connection
+CLOUDBEDS_SETTINGS_KEYS = [
+    "cloudbeds_access_token",
+    "cloudbeds_refresh_token",
+    "cloudbeds_property_id",
+]
+
+# Token-endpoint form bodies: the grant type and client credentials are fixed per process,
+# so they are urlencoded once and only the per-call fields are encoded on each request.
+_FORM_HEADERS = {"Content-Type": "application/x-www-form-urlencoded"}
+
+
+def _token_form_prefix(grant_type: str) -> bytes:
+    params = {
+        "grant_type": grant_type,
+        "client_id": settings.cloudbeds_client_id or "",
+        "client_secret": settings.cloudbeds_client_secret or "",
+    }
+    return f"{urlencode(params)}&".encode()
+
+
+_CODE_FORM_PREFIX = _token_form_prefix("authorization_code")
+_REFRESH_FORM_PREFIX = _token_form_prefix("refresh_token")
+
+# Key spellings Cloudbeds has used for the property id, in lookup order. The id may sit
+# at the top level or in "resources" (a list or a single dict), e.g.
+# {"resources": [{"type": "property", "id": "320133"}]}.
+_PROPERTY_ID_KEYS = ("property_id", "propertyID", "propertyId")
+_RESOURCE_ID_KEYS = ("id",) + _PROPERTY_ID_KEYS
+
+
+def _first_value(data: dict, keys: tuple[str, ...]):
+    return next((data[k] for k in keys if data.get(k)), None)
+
+
+def _extract_property_id(token_data: dict):
+    """Property id from a Cloudbeds token response, or None if it carries none."""
+    property_id = _first_value(token_data, _PROPERTY_ID_KEYS)
+    if property_id:
+        return property_id
+    resources = token_data.get("resources")
+    if isinstance(resources, list):
+        resources = resources[0] if resources else None
+    if isinstance(resources, dict):
+        return _first_value(resources, _RESOURCE_ID_KEYS)
+    return None
+
+
+# Router is mounted at /oauth/cloudbeds (no /api prefix)
+CALLBACK_PATH = "/oauth/cloudbeds/callback"
+OAUTH_STATE_TTL = 300  # seconds the user has to finish the Cloudbeds consent screen
+# Use public_api_base_url (set on server), fallback to base_url; both are fixed per deploy
+_CONFIGURED_BASE_URL = settings.public_api_base_url or settings.base_url
+_REDIRECT_URI = f"{_CONFIGURED_BASE_URL}{CALLBACK_PATH}" if _CONFIGURED_BASE_URL else None
+
+
+def _auth_url_prefix(client_id: str, redirect_uri: str) -> str:
+    """Authorize URL up to and including "state=" (same encoding as urlencode)."""
+    params = {
+        "client_id": client_id,
+        "redirect_uri": redirect_uri,
+        "response_type": "code",
+        "scope": CLOUDBEDS_SCOPE,
+    }
+    return f"{CLOUDBEDS_AUTH_URL}?{urlencode(params)}&state="
+
+
+# Everything but the state is fixed per deploy when the client id and a base URL are set
+_AUTH_URL_PREFIX = (
+    _auth_url_prefix(settings.cloudbeds_client_id, _REDIRECT_URI)
+    if settings.cloudbeds_client_id and _REDIRECT_URI
+    else None
+)
+
+
+def _state_signature(payload: str) -> str:
+    digest = hmac.new(
+        settings.jwt_secret.encode(), f"cloudbeds-oauth:{payload}".encode(), hashlib.sha256
+    ).digest()
+    return base64.urlsafe_b64encode(digest[:16]).rstrip(b"=").decode()
+
+
+def _sign_state(hotel_id: int) -> str:
+    """OAuth state "<nonce>.<hotel_id>.<expires_at>.<hmac>"; also the Redis record key.
+
+    The user's token never goes into the state (it is sent to Cloudbeds and back in the
+    URL); it stays in Redis, which also keeps each state single-use.
+    """
+    expires_at = int(time.time()) + OAUTH_STATE_TTL
+    payload = f"{secrets.token_urlsafe(16)}.{hotel_id}.{expires_at}"
+    return f"{payload}.{_state_signature(payload)}"
+
+
+def _verify_state(state: str) -> bool:
+    """True if the state was signed by this app and has not expired (no I/O)."""
+    payload, _, signature = state.rpartition(".")
+    if not payload or not hmac.compare_digest(
+        signature.encode(), _state_signature(payload).encode()
+    ):
+        return False
+    try:
+        expires_at = int(payload.rsplit(".", 1)[1])
+    except (IndexError, ValueError):
+        return False
+    return expires_at > time.time()
+
+
+async def _store_oauth_state(state: str, hotel_id: int, user_token: str | None) -> None:
+    """Keep the OAuth state as a hash for OAUTH_STATE_TTL seconds (one round trip)."""
+    key = f"oauth:{state}"
+    async with redis_client.pipeline() as pipe:
+        pipe.hset(key, mapping={"hotel_id": hotel_id, "user_token": user_token or ""})
+        pipe.expire(key, OAUTH_STATE_TTL)
+        await pipe.execute()
+
+
+async def _pop_oauth_state(state: str) -> dict:
+    """Read and delete the OAuth state atomically (MULTI/EXEC), so it is single-use."""
+    key = f"oauth:{state}"
+    async with redis_client.pipeline() as pipe:
+        pipe.hgetall(key)
+        pipe.delete(key)
+        data, _ = await pipe.execute()
+    return data
+
+
+async def _create_default_journeys(db: Session, hotel_id: int) -> None:
+    """Auto-create default Journeys once PMS is configured via OAuth (never raises)."""
+    try:
+        await run_in_threadpool(_ensure_default_journeys, db, hotel_id)
+        logger.info("Created default journeys for hotel %s", hotel_id)
+    except Exception as e:
+        logger.error("Failed to create default journeys for hotel %s: %s", hotel_id, e)
 
 
 def _get_redirect_uri(request: Request) -> str:
-    """Build the OAuth callback URL."""
-    settings = get_settings()
-    # Use public_api_base_url (set on server), fallback to base_url, then request
-    base_url = (
-        settings.public_api_base_url or settings.base_url or str(request.base_url).rstrip("/")
-    )
-    # Router is mounted at /oauth/cloudbeds (no /api prefix)
-    return f"{base_url}/oauth/cloudbeds/callback"
+    """Build the OAuth callback URL (from the request only when no base URL is configured)."""
+    return _REDIRECT_URI or f"{str(request.base_url).rstrip('/')}{CALLBACK_PATH}"
 
 
 @router.get("/authorize/{hotel_id}")
-def cloudbeds_authorize(
+async def cloudbeds_authorize(
     hotel_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     token: str = Query(None, description="User auth token to preserve after OAuth"),
 ):
     """
@@ -51,11 +200,8 @@ def cloudbeds_authorize(
     Redirects admin to Cloudbeds login page.
     After approval, Cloudbeds redirects back to /callback with auth code.
     """
-    settings = get_settings()
-
     # Verify hotel exists
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
-    if not hotel:
+    if not await db.scalar(select(Hotel.id).where(Hotel.id == hotel_id)):
         raise HTTPException(status_code=404, detail="Hotel not found")
 
     # Check if Cloudbeds client credentials are configured
@@ -66,27 +212,16 @@ def cloudbeds_authorize(
             detail="Cloudbeds client_id not configured. Set CLOUDBEDS_CLIENT_ID in .env",
         )
 
-    # Generate state token for CSRF protection
+    # Generate a signed state token for CSRF protection
     # Store hotel_id and user_token in Redis (expires in 5 minutes)
-    state = secrets.token_urlsafe(32)
+    state = _sign_state(hotel_id)
     if not redis_client:
         raise HTTPException(status_code=500, detail="Redis unavailable for OAuth state storage")
-    redis_client.setex(
-        f"oauth:{state}", 300, json.dumps({"hotel_id": hotel_id, "user_token": token})
-    )
-
-    # Build authorization URL
-    redirect_uri = _get_redirect_uri(request)
-    params = {
-        "client_id": client_id,
-        "redirect_uri": redirect_uri,
-        "response_type": "code",
-        "scope": "read:reservation read:guest",
-        "state": state,
-    }
+    await _store_oauth_state(state, hotel_id, token)
 
-    auth_url = f"{CLOUDBEDS_AUTH_URL}?{urlencode(params)}"
-    logger.info(f"Redirecting hotel {hotel_id} to Cloudbeds OAuth: {auth_url}")
+    # Build authorization URL (the state is URL-safe and needs no quoting)
+    auth_url = (_AUTH_URL_PREFIX or _auth_url_prefix(client_id, _get_redirect_uri(request))) + state
+    logger.info("Redirecting hotel %s to Cloudbeds OAuth: %s", hotel_id, auth_url)
 
     return RedirectResponse(url=auth_url)
 
@@ -103,17 +238,17 @@ async def cloudbeds_callback(
 
     Exchanges authorization code for access token and saves to hotel settings.
     """
-    settings = get_settings()
-
-    # Verify state token and retrieve stored data from Redis
-    raw = redis_client.getdel(f"oauth:{state}") if redis_client else None
-    state_data = json.loads(raw) if raw else None
+    # Verify the state signature locally (forged/expired states never reach Redis),
+    # then consume the single-use record from Redis
+    if not _verify_state(state):
+        raise HTTPException(status_code=400, detail="Invalid or expired state token")
+    state_data = await _pop_oauth_state(state) if redis_client else None
     if not state_data:
         raise HTTPException(status_code=400, detail="Invalid or expired state token")
-    hotel_id = state_data.get("hotel_id")
-    user_token = state_data.get("user_token")
+    hotel_id = int(state_data[b"hotel_id"])
+    user_token = state_data.get(b"user_token", b"").decode() or None
 
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel = db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -121,89 +256,65 @@ async def cloudbeds_callback(
     redirect_uri = _get_redirect_uri(request)
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                CLOUDBEDS_TOKEN_URL,
-                data={
-                    "grant_type": "authorization_code",
-                    "client_id": settings.cloudbeds_client_id,
-                    "client_secret": settings.cloudbeds_client_secret,
-                    "redirect_uri": redirect_uri,
-                    "code": code,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            response.raise_for_status()
-            token_data = response.json()
-            logger.info(f"Cloudbeds token response keys: {list(token_data.keys())}")
+        response = await _CLOUDBEDS_HTTP.post(
+            CLOUDBEDS_TOKEN_URL,
+            content=_CODE_FORM_PREFIX
+            + urlencode({"redirect_uri": redirect_uri, "code": code}).encode(),
+            headers=_FORM_HEADERS,
+        )
     except httpx.HTTPError as e:
-        logger.error(f"Cloudbeds token exchange failed for hotel {hotel_id}: {e}")
+        logger.error("Cloudbeds token exchange failed for hotel %s: %s", hotel_id, e)
+        raise HTTPException(status_code=500, detail="Failed to exchange authorization code")
+    # Status check instead of raise_for_status(): no httpx exception built on 4xx/5xx
+    if not response.is_success:
+        logger.error(
+            "Cloudbeds token exchange failed for hotel %s: HTTP %s %s",
+            hotel_id,
+            response.status_code,
+            response.text[:200],
+        )
         raise HTTPException(status_code=500, detail="Failed to exchange authorization code")
+    token_data = orjson.loads(response.content)
+    if logger.isEnabledFor(logging.INFO):
+        logger.info("Cloudbeds token response keys: %s", list(token_data.keys()))
 
     # Save tokens to hotel settings
+    # Fail before extracting anything else; a null/empty token is as unusable as a missing one
     access_token = token_data.get("access_token")
-    refresh_token = token_data.get("refresh_token")
-    # Property ID might be in 'property_id', 'propertyID', or 'resources' object
-    property_id = (
-        token_data.get("property_id")
-        or token_data.get("propertyID")
-        or token_data.get("propertyId")
-    )
-    # Check if it's in resources (can be list or dict)
-    # Cloudbeds returns: {"resources": [{"type": "property", "id": "320133"}]}
-    resources = token_data.get("resources")
-    if not property_id and resources:
-        if isinstance(resources, list) and len(resources) > 0:
-            # Resources is a list of properties
-            first_resource = resources[0] if isinstance(resources[0], dict) else {}
-            property_id = (
-                first_resource.get("id")
-                or first_resource.get("property_id")
-                or first_resource.get("propertyID")
-                or first_resource.get("propertyId")
-            )
-            logger.info(f"Found property_id in resources list: {property_id}")
-        elif isinstance(resources, dict):
-            property_id = (
-                resources.get("id") or resources.get("property_id") or resources.get("propertyID")
-            )
-            logger.info(f"Found property_id in resources dict: {property_id}")
-
     if not access_token:
         raise HTTPException(status_code=500, detail="No access token received")
+    refresh_token = token_data.get("refresh_token")
+    property_id = _extract_property_id(token_data)
+    logger.info("Cloudbeds property_id from token response: %s", property_id)
 
     # Update hotel settings
     hotel_settings = hotel.settings or {}
     hotel_settings["cloudbeds_access_token"] = access_token
     hotel_settings["cloudbeds_refresh_token"] = refresh_token
     hotel_settings["cloudbeds_property_id"] = property_id
-    hotel.settings = hotel_settings
-    flag_modified(hotel, "settings")  # Force SQLAlchemy to detect JSON changes
+    hotel.settings = hotel_settings  # MutableDict column: key writes are tracked
 
     # Set PMS type to cloudbeds
     hotel.pms_type = "cloudbeds"
     hotel.pms_property_id = property_id
     hotel.pms_api_key = "OAUTH"  # Marker that we use OAuth
 
-    db.add(hotel)
     db.commit()
+    invalidate_integrations_cache(hotel_id)  # hotel_id, not hotel.id: commit() expired it
 
-    # Auto-create default Journeys when PMS is configured via OAuth
-    try:
-        _ensure_default_journeys(db, hotel.id)
-        logger.info(f"Created default journeys for hotel {hotel.id}")
-    except Exception as e:
-        logger.error(f"Failed to create default journeys for hotel {hotel.id}: {e}")
-
-    logger.info(f"✅ Cloudbeds OAuth successful for hotel {hotel_id}, property {property_id}")
+    logger.info("✅ Cloudbeds OAuth successful for hotel %s, property %s", hotel_id, property_id)
 
     # Redirect back to integrations page with success message
     # Token is preserved via Redis temporary code (not exposed in URL)
     redirect_url = "/ui/admin/settings/integrations?cloudbeds_connected=1"
+    # Default journeys (DB, worker thread) and the return-code write (Redis) are
+    # independent: run them concurrently so the Redis round trip hides behind the DB work
+    side_work = [_create_default_journeys(db, hotel_id)]
     if user_token and redis_client:
         return_code = secrets.token_urlsafe(32)
-        redis_client.setex(f"oauth_return:{return_code}", 300, user_token)
+        side_work.append(redis_client.setex(f"oauth_return:{return_code}", 300, user_token))
         redirect_url += f"&code={quote(return_code, safe='')}"
+    await asyncio.gather(*side_work)
     return RedirectResponse(url=redirect_url, status_code=303)
 
 
@@ -218,9 +329,7 @@ async def cloudbeds_refresh_token(
 
     Called automatically when access token expires.
     """
-    settings = get_settings()
-
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel = db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -231,35 +340,38 @@ async def cloudbeds_refresh_token(
         raise HTTPException(status_code=400, detail="No refresh token available")
 
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                CLOUDBEDS_TOKEN_URL,
-                data={
-                    "grant_type": "refresh_token",
-                    "client_id": settings.cloudbeds_client_id,
-                    "client_secret": settings.cloudbeds_client_secret,
-                    "refresh_token": refresh_token,
-                },
-                headers={"Content-Type": "application/x-www-form-urlencoded"},
-            )
-            response.raise_for_status()
-            token_data = response.json()
+        response = await _CLOUDBEDS_HTTP.post(
+            CLOUDBEDS_TOKEN_URL,
+            content=_REFRESH_FORM_PREFIX + urlencode({"refresh_token": refresh_token}).encode(),
+            headers=_FORM_HEADERS,
+        )
     except httpx.HTTPError as e:
-        logger.error(f"Cloudbeds token refresh failed for hotel {hotel_id}: {e}")
+        logger.error("Cloudbeds token refresh failed for hotel %s: %s", hotel_id, e)
+        raise HTTPException(status_code=500, detail="Failed to refresh token")
+    if not response.is_success:
+        logger.error(
+            "Cloudbeds token refresh failed for hotel %s: HTTP %s %s",
+            hotel_id,
+            response.status_code,
+            response.text[:200],
+        )
         raise HTTPException(status_code=500, detail="Failed to refresh token")
+    token_data = orjson.loads(response.content)
 
     # Update tokens
     new_access_token = token_data.get("access_token")
+    if not new_access_token:
+        # Keep the stored tokens rather than overwriting them with nothing
+        raise HTTPException(status_code=500, detail="No access token received")
     new_refresh_token = token_data.get("refresh_token", refresh_token)
 
     hotel_settings["cloudbeds_access_token"] = new_access_token
     hotel_settings["cloudbeds_refresh_token"] = new_refresh_token
     hotel.settings = hotel_settings
 
-    db.add(hotel)
     db.commit()
 
-    logger.info(f"✅ Cloudbeds token refreshed for hotel {hotel_id}")
+    logger.info("✅ Cloudbeds token refreshed for hotel %s", hotel_id)
 
     return {"success": True, "message": "Token refreshed"}
 
@@ -275,26 +387,29 @@ def cloudbeds_disconnect(
 
     Removes OAuth tokens from hotel settings.
     """
-    hotel = db.query(Hotel).filter(Hotel.id == hotel_id).first()
-    if not hotel:
+    # One UPDATE: drop the Cloudbeds keys server-side (jsonb "-" text[]) and clear the PMS
+    # columns only when they point at Cloudbeds; no SELECT, no settings round trip.
+    result = db.execute(
+        update(Hotel)
+        .where(Hotel.id == hotel_id)
+        .values(
+            settings=cast(
+                cast(Hotel.settings, JSONB).op("-")(cast(CLOUDBEDS_SETTINGS_KEYS, ARRAY(Text))),
+                Hotel.settings.type,
+            ),
+            pms_type=case((Hotel.pms_type == "cloudbeds", None), else_=Hotel.pms_type),
+            pms_property_id=case(
+                (Hotel.pms_type == "cloudbeds", None), else_=Hotel.pms_property_id
+            ),
+            pms_api_key=case((Hotel.pms_type == "cloudbeds", None), else_=Hotel.pms_api_key),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if not result.rowcount:
         raise HTTPException(status_code=404, detail="Hotel not found")
-
-    # Remove Cloudbeds tokens from settings
-    hotel_settings = hotel.settings or {}
-    hotel_settings.pop("cloudbeds_access_token", None)
-    hotel_settings.pop("cloudbeds_refresh_token", None)
-    hotel_settings.pop("cloudbeds_property_id", None)
-    hotel.settings = hotel_settings
-
-    # Clear PMS if it was cloudbeds
-    if hotel.pms_type == "cloudbeds":
-        hotel.pms_type = None
-        hotel.pms_property_id = None
-        hotel.pms_api_key = None
-
-    db.add(hotel)
     db.commit()
+    invalidate_integrations_cache(hotel_id)
 
-    logger.info(f"🔌 Cloudbeds disconnected for hotel {hotel_id}")
+    logger.info("🔌 Cloudbeds disconnected for hotel %s", hotel_id)
 
     return {"success": True, "message": "Cloudbeds disconnected"}
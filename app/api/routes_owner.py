@@ -7,14 +7,17 @@ from fastapi import APIRouter, Depends, HTTPException, Request, status
 from linebot import LineBotApi
 from linebot.exceptions import LineBotApiError
 from pydantic import BaseModel, EmailStr, constr
-from sqlalchemy import func
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy.orm.attributes import flag_modified
+from starlette.concurrency import run_in_threadpool
 
+from app.api.routes_admin_integrations import invalidate_integrations_cache
 from app.api.routes_auth import _send_email
 from app.core.config import get_settings
-from app.core.db import get_db
+from app.core.db import get_async_db, get_db
 from app.core.security import (
+    DUMMY_PASSWORD_HASH,
     create_access_token,
     decode_access_token,
     get_bearer_token,
@@ -36,7 +39,9 @@ settings = get_settings()
 logger = logging.getLogger("hotelbot")
 
 
-def require_owner(request: Request, db: Session = Depends(get_db)) -> PlatformOwner:
+async def require_owner(
+    request: Request, db: AsyncSession = Depends(get_async_db)
+) -> PlatformOwner:
     token = get_bearer_token(request) or request.headers.get("X-Owner-Token")
     if not token:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -44,10 +49,10 @@ def require_owner(request: Request, db: Session = Depends(get_db)) -> PlatformOw
         payload = decode_access_token(token)
     except Exception:
         raise HTTPException(status_code=401, detail="Unauthorized")
-    owner = (
-        db.query(PlatformOwner)
-        .filter(PlatformOwner.id == int(payload.get("sub")), PlatformOwner.is_active == True)
-        .first()
+    owner = await db.scalar(
+        select(PlatformOwner).where(
+            PlatformOwner.id == int(payload.get("sub")), PlatformOwner.is_active == True
+        )
     )  # noqa: E712
     if not owner:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -128,8 +133,8 @@ class PlatformSettingsPayload(BaseModel):
 
 
 @router.get("/hotels")
-def list_hotels(db: Session = Depends(get_db), _auth=Depends(require_owner)):
-    hotels: List[Hotel] = db.query(Hotel).all()
+async def list_hotels(db: AsyncSession = Depends(get_async_db), _auth=Depends(require_owner)):
+    hotels: List[Hotel] = (await db.scalars(select(Hotel))).all()
     return [{"id": h.id, "name": h.name, "timezone": h.timezone} for h in hotels]
 
 
@@ -248,7 +253,8 @@ def owner_login(payload: OwnerLoginRequest, request: Request, db: Session = Depe
         .filter(PlatformOwner.email == payload.email, PlatformOwner.is_active == True)
         .first()
     )  # noqa: E712
-    if not owner or not verify_password(payload.password, owner.password_hash):
+    password_hash = owner.password_hash if owner else DUMMY_PASSWORD_HASH
+    if not verify_password(payload.password, password_hash) or not owner:
         logger.warning(
             f"Failed owner login attempt for email: {payload.email} from IP: {request.client.host}"
         )
@@ -260,44 +266,48 @@ def owner_login(payload: OwnerLoginRequest, request: Request, db: Session = Depe
 
 
 @router.put("/change-password")
-def owner_change_password(
+async def owner_change_password(
     payload: CreateHotelAdminRequest,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     owner: PlatformOwner = Depends(require_owner),
 ):
     # reuse fields admin_password for new password
     if not payload.admin_password:
         raise HTTPException(status_code=400, detail="New password required")
-    owner.password_hash = hash_password(payload.admin_password)
-    db.add(owner)
-    db.commit()
+    owner.password_hash = await run_in_threadpool(hash_password, payload.admin_password)
+    await db.commit()
     return {"success": True}
 
 
 @router.get("/hotels/{hotel_id}/usage/daily")
-def hotel_usage_daily(
+async def hotel_usage_daily(
     hotel_id: int,
     days: int = 30,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
-    return get_daily_usage(db, hotel_id=hotel_id, days=days)
+    return await db.run_sync(get_daily_usage, hotel_id=hotel_id, days=days)
 
 
 @router.get("/overview")
-def overview(days: int = 30, db: Session = Depends(get_db), _auth=Depends(require_owner)):
+async def overview(
+    days: int = 30, db: AsyncSession = Depends(get_async_db), _auth=Depends(require_owner)
+):
     # Sum per hotel
     cutoff = datetime.now(timezone.utc) - timedelta(days=days)
-    query = db.query(
-        UsageDaily.hotel_id,
-        func.sum(UsageDaily.messages_in).label("messages_in"),
-        func.sum(UsageDaily.messages_out_bot).label("messages_out_bot"),
-        func.sum(UsageDaily.tasks_created).label("tasks_created"),
-        func.sum(UsageDaily.tasks_done).label("tasks_done"),
-        func.sum(UsageDaily.llm_calls).label("llm_calls"),
+    query = (
+        select(
+            UsageDaily.hotel_id,
+            func.sum(UsageDaily.messages_in).label("messages_in"),
+            func.sum(UsageDaily.messages_out_bot).label("messages_out_bot"),
+            func.sum(UsageDaily.tasks_created).label("tasks_created"),
+            func.sum(UsageDaily.tasks_done).label("tasks_done"),
+            func.sum(UsageDaily.llm_calls).label("llm_calls"),
+        )
+        .where(UsageDaily.date >= cutoff.date())
+        .group_by(UsageDaily.hotel_id)
     )
-    query = query.filter(UsageDaily.date >= cutoff.date())
-    sub = query.group_by(UsageDaily.hotel_id).all()
+    sub = (await db.execute(query)).all()
     result = []
     for row in sub:
         total_in = row.messages_in or 0
@@ -326,13 +336,13 @@ def _mask(val: Optional[str]) -> Optional[str]:
 
 
 @router.get("/hotel/{hotel_id}/connection-status")
-def connection_status(
+async def connection_status(
     hotel_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
-    hotel: Optional[Hotel] = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel: Optional[Hotel] = await db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -363,7 +373,7 @@ def connection_status(
 
     try:
         client = LineBotApi(access_token)
-        client.get_bot_info()
+        await run_in_threadpool(client.get_bot_info)
         return {
             "status": "ok",
             "message": "Connected to LINE",
@@ -391,13 +401,13 @@ def connection_status(
 
 
 @router.get("/hotels/{hotel_id}/connection", response_model=ConnectionSettingsResponse)
-def get_connection_settings(
+async def get_connection_settings(
     hotel_id: int,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
-    hotel: Optional[Hotel] = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel: Optional[Hotel] = await db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
     settings_dict = hotel.settings or {}
@@ -423,14 +433,14 @@ def get_connection_settings(
 
 
 @router.put("/hotels/{hotel_id}/connection", response_model=ConnectionSettingsResponse)
-def update_connection_settings(
+async def update_connection_settings(
     hotel_id: int,
     payload: ConnectionSettingsUpdateRequest,
     request: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
-    hotel: Optional[Hotel] = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel: Optional[Hotel] = await db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
@@ -480,8 +490,8 @@ def update_connection_settings(
         settings_dict.pop("whatsapp_access_token", None)
         settings_dict.pop("whatsapp_business_account_id", None)
         base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
-        success, warn = setup_line_webhook(
-            hotel.id, payload.line_channel_access_token, base_url=base_url
+        success, warn = await run_in_threadpool(
+            setup_line_webhook, hotel.id, payload.line_channel_access_token, base_url=base_url
         )
         warning = warn
     else:
@@ -496,10 +506,8 @@ def update_connection_settings(
         settings_dict.pop("line_channel_access_token", None)
 
     hotel.settings = settings_dict
-    flag_modified(hotel, "settings")
-    db.add(hotel)
-    db.commit()
-    db.refresh(hotel)
+    await db.commit()
+    await run_in_threadpool(invalidate_integrations_cache, hotel.id)
 
     base_url = settings.public_api_base_url or str(request.base_url).rstrip("/")
     webhook_url = f"{base_url}/webhook/line/{hotel.id}" if provider == "line" else None
@@ -532,8 +540,10 @@ def _mask_secret(val: str | None) -> str | None:
 
 
 @router.get("/platform-settings")
-def get_platform_settings(db: Session = Depends(get_db), _auth=Depends(require_owner)):
-    settings_rows = db.query(SystemSetting).all()
+async def get_platform_settings(
+    db: AsyncSession = Depends(get_async_db), _auth=Depends(require_owner)
+):
+    settings_rows = (await db.scalars(select(SystemSetting))).all()
     data = {row.key: row.value for row in settings_rows}
     return {
         "OPENAI_API_KEY": _mask_secret(data.get("OPENAI_API_KEY")),
@@ -543,9 +553,9 @@ def get_platform_settings(db: Session = Depends(get_db), _auth=Depends(require_o
 
 
 @router.put("/platform-settings")
-def update_platform_settings(
+async def update_platform_settings(
     payload: PlatformSettingsPayload,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
     incoming = {
@@ -553,22 +563,24 @@ def update_platform_settings(
         "RESEND_API_KEY": payload.resend_api_key,
         "WHATSAPP_PLATFORM_TOKEN": payload.whatsapp_platform_token,
     }
+    incoming = {key: val for key, val in incoming.items() if val is not None}
+    existing = {
+        row.key: row
+        for row in await db.scalars(select(SystemSetting).where(SystemSetting.key.in_(incoming)))
+    }
     for key, val in incoming.items():
-        if val is None:
-            continue
-        row = db.query(SystemSetting).filter(SystemSetting.key == key).first()
+        row = existing.get(key)
         if not row:
-            row = SystemSetting(key=key, value=val)
+            db.add(SystemSetting(key=key, value=val))
         else:
             row.value = val
-        db.add(row)
-    db.commit()
+    await db.commit()
     return {"success": True}
 
 
 @router.get("/hotels/detailed")
-def list_hotels_detailed(
-    db: Session = Depends(get_db),
+async def list_hotels_detailed(
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
     """
@@ -577,21 +589,22 @@ def list_hotels_detailed(
     - Usage stats for last 30 days (aggregate from UsageDaily)
     - Connection status indicators
     """
-    hotels: List[Hotel] = db.query(Hotel).all()
+    hotels: List[Hotel] = (await db.scalars(select(Hotel))).all()
 
     # Get usage stats for last 30 days per hotel
     cutoff = datetime.now(timezone.utc) - timedelta(days=30)
     usage_query = (
-        db.query(
-            UsageDaily.hotel_id,
-            func.sum(UsageDaily.messages_in).label("messages_in"),
-            func.sum(UsageDaily.tasks_created).label("tasks_created"),
-            func.sum(UsageDaily.llm_calls).label("llm_calls"),
+        await db.execute(
+            select(
+                UsageDaily.hotel_id,
+                func.sum(UsageDaily.messages_in).label("messages_in"),
+                func.sum(UsageDaily.tasks_created).label("tasks_created"),
+                func.sum(UsageDaily.llm_calls).label("llm_calls"),
+            )
+            .where(UsageDaily.date >= cutoff.date())
+            .group_by(UsageDaily.hotel_id)
         )
-        .filter(UsageDaily.date >= cutoff.date())
-        .group_by(UsageDaily.hotel_id)
-        .all()
-    )
+    ).all()
 
     # Convert usage to dict for quick lookup
     usage_by_hotel = {
@@ -603,6 +616,16 @@ def list_hotels_detailed(
         for row in usage_query
     }
 
+    # First admin email per hotel, in one query
+    admin_email_by_hotel: dict[int, str] = {}
+    admin_rows = await db.execute(
+        select(StaffUser.hotel_id, StaffUser.email)
+        .where(StaffUser.role.ilike("admin"))
+        .order_by(StaffUser.hotel_id, StaffUser.id)
+    )
+    for hotel_id, email in admin_rows:
+        admin_email_by_hotel.setdefault(hotel_id, email)
+
     result = []
     now = datetime.now(timezone.utc)
 
@@ -637,13 +660,7 @@ def list_hotels_detailed(
         # Get usage for this hotel
         usage = usage_by_hotel.get(h.id, {"messages_in": 0, "tasks_created": 0, "llm_calls": 0})
 
-        # Get admin email for this hotel
-        admin_user = (
-            db.query(StaffUser)
-            .filter(StaffUser.hotel_id == h.id, StaffUser.role.ilike("admin"))
-            .first()
-        )
-        admin_email = admin_user.email if admin_user else None
+        admin_email = admin_email_by_hotel.get(h.id)
 
         result.append(
             {
@@ -668,28 +685,28 @@ def list_hotels_detailed(
 
 
 @router.delete("/hotels/{hotel_id}")
-def delete_hotel(
+async def delete_hotel(
     hotel_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     _auth=Depends(require_owner),
 ):
     """
     Deletes a hotel and all related data.
     Uses cascading delete as configured in the models.
     """
-    hotel: Optional[Hotel] = db.query(Hotel).filter(Hotel.id == hotel_id).first()
+    hotel: Optional[Hotel] = await db.get(Hotel, hotel_id)
     if not hotel:
         raise HTTPException(status_code=404, detail="Hotel not found")
 
     hotel_name = hotel.name
 
     try:
-        db.delete(hotel)
-        db.commit()
+        await db.delete(hotel)
+        await db.commit()
         logger.info(f"Owner deleted hotel: id={hotel_id}, name={hotel_name}")
         return {"success": True, "message": f"Hotel '{hotel_name}' has been deleted."}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Failed to delete hotel {hotel_id}: {e}")
         raise HTTPException(
             status_code=500, detail="Failed to delete hotel. Please try again or contact support."
@@ -1,5 +1,6 @@
 import logging
 import secrets
+from functools import lru_cache
 
 from pydantic_settings import BaseSettings
 
@@ -80,7 +81,10 @@ class Settings(BaseSettings):
     trusted_proxy_hosts: str = ""
 
 
+@lru_cache
 def get_settings() -> Settings:
+    # Cached: env/.env parsing and validation run once per process, and the dev-mode
+    # random JWT secret stays stable instead of changing on every call.
     settings = Settings()
 
     # JWT Secret validation - ALWAYS enforce minimum length
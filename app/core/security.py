@@ -1,3 +1,4 @@
+import os
 import threading
 import time
 import uuid
@@ -7,7 +8,8 @@ from typing import Dict, Optional
 import bcrypt
 import jwt
 import redis
-from fastapi import HTTPException, Request, status
+import redis.asyncio
+from fastapi import HTTPException, Request, Response, status
 
 from app.core.config import get_settings
 
@@ -22,13 +24,32 @@ try:
 except Exception:
     _redis = None
 
+# asyncio client for async handlers, so a Redis round trip yields the event loop instead
+# of blocking it (connections are opened lazily from its own pool)
+_async_redis = None
+try:
+    _async_redis = redis.asyncio.from_url(settings.redis_url)
+except Exception:
+    _async_redis = None
+
+# INCR + first-hit EXPIRE in one atomic round trip. Expiring only on the first hit keeps
+# a fixed window (re-arming the TTL on every call let a steady stream never reset).
+_RATE_LIMIT_SCRIPT = (
+    _redis.register_script(
+        "local c = redis.call('INCR', KEYS[1]) "
+        "if c == 1 then redis.call('EXPIRE', KEYS[1], ARGV[1]) end "
+        "return c"
+    )
+    if _redis
+    else None
+)
+
 
 def rate_limit(key: str, limit: int, window_seconds: int = 60) -> None:
     # Prefer Redis for cross-process safety
     if _redis:
         try:
-            count = _redis.incr(key, 1)
-            _redis.expire(key, window_seconds)
+            count = _RATE_LIMIT_SCRIPT(keys=[key], args=[window_seconds])
             if count > limit:
                 raise HTTPException(
                     status_code=status.HTTP_429_TOO_MANY_REQUESTS,
@@ -61,6 +82,15 @@ def rate_limit(key: str, limit: int, window_seconds: int = 60) -> None:
         )
 
 
+# At most one bcrypt check per CPU at a time: a login burst queues here instead of
+# oversubscribing the cores every other request needs
+_BCRYPT_SLOTS = threading.BoundedSemaphore(os.cpu_count() or 1)
+
+# Checked against when the account doesn't exist, so unknown emails cost the same bcrypt
+# time as a wrong password (no user-enumeration timing signal). Hash of a random secret.
+DUMMY_PASSWORD_HASH = "$2b$12$fxK7bf/b8k7hBdHJKajvn.WGqr4nlMi9s4AsRZtWtonIBmqT7y.aC"
+
+
 def hash_password(password: str) -> str:
     salt = bcrypt.gensalt()
     return bcrypt.hashpw(password.encode("utf-8"), salt).decode("utf-8")
@@ -68,7 +98,8 @@ def hash_password(password: str) -> str:
 
 def verify_password(password: str, hashed: str) -> bool:
     try:
-        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+        with _BCRYPT_SLOTS:
+            return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
     except Exception:
         return False
 
@@ -100,3 +131,20 @@ def get_bearer_token(request: Request) -> Optional[str]:
     if auth_header.startswith("Bearer "):
         return auth_header.split(" ", 1)[1].strip()
     return None
+
+
+# Everything but the token is fixed per process, so the Set-Cookie header is formatted
+# once here (same attributes and order Starlette's set_cookie emits). JWTs only contain
+# URL-safe base64 and dots, which never need cookie quoting.
+ADMIN_COOKIE_MAX_AGE = 5184000  # 60 days
+_ADMIN_COOKIE_FORMAT = (
+    "admin_token={}; HttpOnly; Max-Age=%d; Path=/; SameSite=lax" % ADMIN_COOKIE_MAX_AGE
+    + ("; Secure" if settings.environment == "production" else "")
+)
+
+
+def set_admin_cookie(response: Response, token: str) -> None:
+    """Attach the admin session cookie (HttpOnly, lax, Secure in production)."""
+    response.raw_headers.append(
+        (b"set-cookie", _ADMIN_COOKIE_FORMAT.format(token).encode("latin-1"))
+    )
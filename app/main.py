@@ -152,7 +152,7 @@ def create_app() -> FastAPI:
         # except Exception as e:
         #     import logging
         #     logging.getLogger("hotelbot").warning(f"Failed to schedule trial check: {e}")
-        pass
+        routes_admin_ui.precompile_templates()
 
     app.add_middleware(GZipMiddleware, minimum_size=1000)
     app.add_middleware(SecurityHeadersMiddleware)
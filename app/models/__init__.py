@@ -5,6 +5,7 @@ from app.models.models import (
     GuestPII,
     Hotel,
     HotelAIProfile,
+    HotelDocument,
     Journey,
     JourneyEvent,
     JourneyEventStatus,
@@ -9,14 +9,19 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     UniqueConstraint,
+    event,
+    inspect,
+    select,
 )
 from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.ext.mutable import MutableDict
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 
 from app.core.db import Base
 from app.core.encrypted_type import EncryptedString
@@ -90,7 +95,8 @@ class Hotel(Base, TimestampMixin):
     security_pin = Column(EncryptedString, nullable=True)  # ENCRYPTED
     interface_language = Column(String, nullable=False, default="en")
     language_locked = Column(Boolean, nullable=False, default=False)
-    settings = Column(JSONType, nullable=True, default=dict)
+    # MutableDict tracks top-level key writes/pops; nested edits still need flag_modified
+    settings = Column(MutableDict.as_mutable(JSONType), nullable=True, default=dict)
     # Subscription fields
     country = Column(String(2), nullable=True)  # TH, RO, etc.
     subscription_tier = Column(String(20), nullable=False, default="free")  # free/basic/pro
@@ -120,6 +126,7 @@ class Hotel(Base, TimestampMixin):
     )
     usage_events = relationship("UsageEvent", back_populates="hotel", cascade="all, delete-orphan")
     usage_daily = relationship("UsageDaily", back_populates="hotel", cascade="all, delete-orphan")
+    documents = relationship("HotelDocument", back_populates="hotel", cascade="all, delete-orphan")
 
 
 class Guest(Base):
@@ -127,6 +134,7 @@ class Guest(Base):
     __table_args__ = (
         UniqueConstraint("hotel_id", "phone_hash", name="uq_guest_hotel_phone"),
         UniqueConstraint("hotel_id", "line_user_id", name="uq_guest_hotel_line_user"),
+        Index("ix_guest_hotel_active", "hotel_id", postgresql_where=text("is_deleted = false")),
     )
 
     id = Column(Integer, primary_key=True)
@@ -134,6 +142,7 @@ class Guest(Base):
     phone_hash = Column(String, nullable=False)
     line_user_id = Column(String, nullable=True, index=True)
     preferred_language = Column(String, nullable=True)
+    is_deleted = Column(Boolean, nullable=False, default=False)  # GDPR erased
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     hotel = relationship("Hotel", back_populates="guests")
@@ -198,6 +207,10 @@ class Stay(Base, TimestampMixin):
 
 class Conversation(Base, TimestampMixin):
     __tablename__ = "conversation"
+    __table_args__ = (
+        Index("ix_conversation_hotel_updated", "hotel_id", text("updated_at DESC")),
+        Index("ix_conversation_hotel_handler_updated", "hotel_id", "current_handler", "updated_at"),
+    )
 
     id = Column(Integer, primary_key=True)
     hotel_id = Column(Integer, ForeignKey("hotel.id"), nullable=False, index=True)
@@ -214,6 +227,10 @@ class Conversation(Base, TimestampMixin):
     pending_confirmation = Column(Text, nullable=True)
     is_bot_paused = Column(Boolean, nullable=False, default=False)
     last_qr_scan_at = Column(DateTime(timezone=True), nullable=True)
+    # Denormalized for the admin inbox (kept in sync by the listeners below)
+    last_message_text = Column(Text, nullable=True)
+    last_message_at = Column(DateTime(timezone=True), nullable=True)
+    open_tasks_count = Column(Integer, nullable=False, default=0)
 
     hotel = relationship("Hotel", back_populates="conversations")
     guest = relationship("Guest", back_populates="conversations")
@@ -224,6 +241,9 @@ class Conversation(Base, TimestampMixin):
 
 class Message(Base):
     __tablename__ = "message"
+    __table_args__ = (
+        Index("ix_message_conversation_created", "conversation_id", text("created_at DESC")),
+    )
 
     id = Column(Integer, primary_key=True)
     conversation_id = Column(Integer, ForeignKey("conversation.id"), nullable=False, index=True)
@@ -238,6 +258,10 @@ class Message(Base):
 
 class Task(Base):
     __tablename__ = "task"
+    __table_args__ = (
+        Index("ix_task_hotel_created", "hotel_id", text("created_at DESC")),
+        Index("ix_task_stay_open", "stay_id", postgresql_where=text("status = 'OPEN'")),
+    )
 
     id = Column(Integer, primary_key=True)
     hotel_id = Column(Integer, ForeignKey("hotel.id"), nullable=False, index=True)
@@ -355,6 +379,21 @@ class HotelAIProfile(Base):
     hotel = relationship("Hotel", back_populates="ai_profile")
 
 
+class HotelDocument(Base, TimestampMixin):
+    """Large uploaded text (policies, menu) kept out of the hot hotel.settings JSON."""
+
+    __tablename__ = "hotel_document"
+    __table_args__ = (UniqueConstraint("hotel_id", "kind", name="uq_hotel_document_kind"),)
+
+    id = Column(Integer, primary_key=True)
+    hotel_id = Column(Integer, ForeignKey("hotel.id"), nullable=False, index=True)
+    kind = Column(String(50), nullable=False)  # custom_knowledge / hotel_products
+    content = Column(Text, nullable=False, default="")
+    sha256 = Column(String(64), nullable=False)
+
+    hotel = relationship("Hotel", back_populates="documents")
+
+
 class Journey(Base, TimestampMixin):
     __tablename__ = "journey"
 
@@ -438,3 +477,69 @@ class StripeWebhookEvent(Base):
     event_id = Column(String, nullable=False, unique=True, index=True)  # Stripe event ID
     event_type = Column(String, nullable=False)
     processed_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# Conversation summary columns (last_message_*, open_tasks_count)
+# ---------------------------------------------------------------------------
+
+
+def _open_tasks_count(stay_id):
+    return (
+        select(func.count(Task.id))
+        .where(Task.stay_id == stay_id, Task.status == TaskStatus.OPEN)
+        .scalar_subquery()
+    )
+
+
+def _refresh_open_tasks_count(connection, stay_id) -> None:
+    if stay_id is None:
+        return
+    conversations = Conversation.__table__
+    connection.execute(
+        conversations.update().where(conversations.c.stay_id == stay_id)
+        # keep updated_at as-is so summary refreshes don't reorder the inbox
+        .values(open_tasks_count=_open_tasks_count(stay_id), updated_at=conversations.c.updated_at)
+    )
+
+
+@event.listens_for(Message, "after_insert")
+def _message_after_insert(mapper, connection, target) -> None:
+    conversations = Conversation.__table__
+    connection.execute(
+        conversations.update()
+        .where(conversations.c.id == target.conversation_id)
+        .values(
+            last_message_text=target.text,
+            last_message_at=func.now(),
+            updated_at=conversations.c.updated_at,
+        )
+    )
+
+
+@event.listens_for(Task, "after_insert")
+@event.listens_for(Task, "after_delete")
+def _task_after_insert_or_delete(mapper, connection, target) -> None:
+    _refresh_open_tasks_count(connection, target.stay_id)
+
+
+@event.listens_for(Task, "after_update")
+def _task_after_update(mapper, connection, target) -> None:
+    state = inspect(target)
+    status_hist = state.attrs.status.history
+    stay_hist = state.attrs.stay_id.history
+    if not (status_hist.has_changes() or stay_hist.has_changes()):
+        return
+    for stay_id in {target.stay_id, *stay_hist.deleted}:
+        _refresh_open_tasks_count(connection, stay_id)
+
+
+@event.listens_for(Conversation, "before_insert")
+@event.listens_for(Conversation, "before_update")
+def _conversation_stay_changed(mapper, connection, target) -> None:
+    if not inspect(target).attrs.stay_id.history.has_changes():
+        return
+    if target.stay_id is None:
+        target.open_tasks_count = 0
+    else:
+        target.open_tasks_count = _open_tasks_count(target.stay_id)
@@ -0,0 +1,89 @@
+import hashlib
+
+from sqlalchemy.orm import Session, object_session
+
+from app.models import Hotel, HotelDocument
+from app.services.hotel_settings import get_setting, update_settings
+
+# Settings field name (as used by the UI/API) -> hotel_document.kind.
+# hotel.settings only keeps "<kind>_length" / "<kind>_sha256" for these.
+DOCUMENT_FIELDS = {
+    "custom_knowledge_text": "custom_knowledge",
+    "hotel_products_text": "hotel_products",
+}
+
+
+def has_document(settings: dict, field: str) -> bool:
+    """Cheap existence check from the settings metadata (no document query)."""
+    return bool((settings or {}).get(f"{DOCUMENT_FIELDS[field]}_length"))
+
+
+def get_document(hotel: Hotel, field: str) -> str:
+    """Load a document's text on demand; returns "" when the hotel has none."""
+    if not hotel or not has_document(hotel.settings, field):
+        return ""
+    db = object_session(hotel)
+    if db is None:
+        return ""
+    content = (
+        db.query(HotelDocument.content)
+        .filter(HotelDocument.hotel_id == hotel.id, HotelDocument.kind == DOCUMENT_FIELDS[field])
+        .scalar()
+    )
+    return content or ""
+
+
+def get_documents(db: Session, hotel: Hotel) -> dict[str, str]:
+    """All document texts for a hotel keyed by settings field name (single query)."""
+    docs = dict.fromkeys(DOCUMENT_FIELDS, "")
+    if not any(has_document(hotel.settings, field) for field in DOCUMENT_FIELDS):
+        return docs
+    rows = (
+        db.query(HotelDocument.kind, HotelDocument.content)
+        .filter(HotelDocument.hotel_id == hotel.id)
+        .all()
+    )
+    by_kind = dict(rows)
+    for field, kind in DOCUMENT_FIELDS.items():
+        docs[field] = by_kind.get(kind) or ""
+    return docs
+
+
+def save_document(
+    db: Session, hotel: Hotel, field: str, content: str, upload_sha256: str | None = None
+) -> None:
+    """Upsert a document and its settings metadata. Caller commits.
+
+    upload_sha256 is the hash of the raw uploaded file (None for text typed in the UI),
+    so an identical re-upload can be recognised without parsing it again.
+    """
+    kind = DOCUMENT_FIELDS[field]
+    content = content.strip()
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    if (
+        get_setting(hotel, f"{kind}_sha256") == digest
+        and get_setting(hotel, f"{kind}_upload_sha256") == upload_sha256
+    ):
+        return  # unchanged - skip rewriting the row
+    if get_setting(hotel, f"{kind}_sha256") != digest:
+        doc = (
+            db.query(HotelDocument)
+            .filter(HotelDocument.hotel_id == hotel.id, HotelDocument.kind == kind)
+            .first()
+        )
+        if doc is None:
+            doc = HotelDocument(hotel_id=hotel.id, kind=kind)
+            db.add(doc)
+        doc.content = content
+        doc.sha256 = digest
+    if hotel.settings:
+        hotel.settings.pop(field, None)  # legacy inline copy
+        hotel.settings.pop(f"{kind}_upload_sha256", None)
+    update_settings(
+        hotel,
+        {
+            f"{kind}_length": len(content),
+            f"{kind}_sha256": digest,
+            f"{kind}_upload_sha256": upload_sha256,
+        },
+    )
@@ -6,6 +6,7 @@ from sqlalchemy.orm import Session
 from app.core.config import get_settings
 from app.models import Hotel, Task, TaskStatus, TaskType
 from app.services.analytics import log_task_created
+from app.services.hotel_documents import get_document
 from app.services.llm_client import LLMClient
 from app.services.staff_notifier import notify_new_task
 
@@ -63,10 +64,9 @@ def build_staff_summary_for_task(
 
     # UPGRADE: Inject hotel products/menu context for detailed food order summaries
     products_context = ""
-    if hotel.settings:
-        hotel_products = hotel.settings.get("hotel_products_text", "")
-        if hotel_products:
-            products_context = f"\n\n=== HOTEL MENU/PRODUCTS ===\n{hotel_products}\n"
+    hotel_products = get_document(hotel, "hotel_products_text")
+    if hotel_products:
+        products_context = f"\n\n=== HOTEL MENU/PRODUCTS ===\n{hotel_products}\n"
 
     system_prompt = (
         "ROLE: You are a professional hotel translator. You receive guest requests in ANY language and produce a concise summary for staff in the specified staff language.\n"
@@ -5,6 +5,7 @@ from typing import Dict, List, Optional
 import requests
 
 from app.core.config import get_settings
+from app.services.hotel_documents import has_document
 from app.utils.message_splitter import WHATSAPP_MAX_LENGTH, split_message
 
 logger = logging.getLogger("hotelbot.whatsapp")
@@ -374,8 +375,8 @@ def get_welcome_buttons(hotel) -> List[Dict[str, str]]:
     labels = BUTTON_LABELS.get(lang, BUTTON_LABELS["en"])
 
     # Check what's available in DB
-    has_policies = bool(settings.get("custom_knowledge_text", "").strip())
-    has_menu = bool(settings.get("hotel_products_text", "").strip())
+    has_policies = has_document(settings, "custom_knowledge_text")
+    has_menu = has_document(settings, "hotel_products_text")
     allow_food_beverage = settings.get("allow_food_beverage", True) is not False
     allow_housekeeping = settings.get("allow_housekeeping", True) is not False
 
@@ -14,6 +14,18 @@ logger = logging.getLogger("hotelbot.gdpr_cleanup")
 RETENTION_DAYS = 90
 
 
+def _clear_last_message(db: Session, conv_ids: list[int]) -> None:
+    """Drop the denormalized last-message preview once the messages are gone."""
+    db.query(Conversation).filter(Conversation.id.in_(conv_ids)).update(
+        {
+            Conversation.last_message_text: None,
+            Conversation.last_message_at: None,
+            Conversation.updated_at: Conversation.updated_at,
+        },
+        synchronize_session="fetch",
+    )
+
+
 def run_gdpr_cleanup() -> dict:
     """
     Delete messages and anonymize guest PII for stays checked out > 90 days ago.
@@ -58,6 +70,7 @@ def run_gdpr_cleanup() -> dict:
                 )
                 stats["messages_deleted"] = deleted_count
                 stats["conversations_cleaned"] = len(conv_ids)
+                _clear_last_message(db, conv_ids)
 
         # 1b. Clean up orphan conversations (BASIC tier, no stay linked) older than 90 days
         orphan_conversations = (
@@ -77,6 +90,7 @@ def run_gdpr_cleanup() -> dict:
             )
             stats["messages_deleted"] += orphan_deleted
             stats["conversations_cleaned"] += len(orphan_conv_ids)
+            _clear_last_message(db, orphan_conv_ids)
 
         # 2. Anonymize GuestPII for these guests
         # Only anonymize if guest has NO active stays (still checked in elsewhere)